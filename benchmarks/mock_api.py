@@ -0,0 +1,608 @@
+#!/usr/bin/env python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Local stand-in for the 1&1 Cloud Server API.
+
+Emulates the endpoints used by the oneandone_* modules closely enough to
+run them offline: paginated and searchable listings, creation with
+DEPLOYING/CONFIGURING states that settle after a number of polls, power
+actions, sub-resources (server IPs, rules, ports, processes, members)
+and the audit log. Latency and error injection are configurable, and
+every request is counted per endpoint.
+
+Run it standalone and point the modules' api_url at it:
+
+    python benchmarks/mock_api.py --port 8080 --servers 100 --latency 0.05
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+# Collection path -> (state a new resource starts in, state it settles in).
+COLLECTIONS = {
+    'servers': ('DEPLOYING', 'POWERED_ON'),
+    'firewall_policies': ('CONFIGURING', 'ACTIVE'),
+    'load_balancers': ('CONFIGURING', 'ACTIVE'),
+    'monitoring_policies': ('CONFIGURING', 'ACTIVE'),
+    'private_networks': ('CONFIGURING', 'ACTIVE'),
+    'public_ips': ('CONFIGURING', 'ACTIVE'),
+    'vpns': ('CONFIGURING', 'ACTIVE'),
+    'users': ('CONFIGURING', 'ACTIVE'),
+    'roles': ('CONFIGURING', 'ACTIVE'),
+}
+
+# Audit log resource type of each collection.
+LOG_TYPES = {
+    'servers': 'VM',
+    'firewall_policies': 'FIREWALL',
+    'load_balancers': 'LOADBALANCER',
+    'monitoring_policies': 'MONITORING_POLICY',
+    'private_networks': 'PRIVATENETWORK',
+    'public_ips': 'IP',
+    'vpns': 'VPN',
+    'users': 'USER',
+    'roles': 'ROLE',
+}
+
+DATACENTERS = [
+    {'id': '908DC2072407C94C8054610AD5A53B8C', 'country_code': 'US', 'location': 'United States of America'},
+    {'id': '4EFAD5836CE43ACA502FD5B99BEE44EF', 'country_code': 'DE', 'location': 'Germany'},
+    {'id': '5091F6D8CBFEF9C26ACE957C652D5D49', 'country_code': 'GB', 'location': 'United Kingdom of Great Britain and Northern Ireland'},
+    {'id': '7C5FA1A1FD88C0BB5F3E1F1E58A38E14', 'country_code': 'ES', 'location': 'Spain'},
+]
+
+FIXED_INSTANCE_SIZES = [
+    {'id': '65929629F35BBFBA63022008F773F3EB', 'name': 'S', 'hardware': {'vcore': 1, 'cores_per_processor': 1, 'ram': 1}},
+    {'id': '591A7D0F0A1D0A95D92A5A9E95A6BD39', 'name': 'M', 'hardware': {'vcore': 1, 'cores_per_processor': 1, 'ram': 2}},
+    {'id': '8C626C1A7005D0D1F527143C413D461E', 'name': 'L', 'hardware': {'vcore': 2, 'cores_per_processor': 1, 'ram': 4}},
+    {'id': '3D4C49EAEDD42FBC23DB58FE3DEF464F', 'name': 'XL', 'hardware': {'vcore': 2, 'cores_per_processor': 1, 'ram': 8}},
+]
+
+APPLIANCES = [
+    {'id': 'A0FAA4587A7CB6BBAA1EA877C844977E', 'name': 'ubuntu1604-64std', 'os_family': 'Linux', 'type': 'IMAGE'},
+    {'id': '753E3C1F859874AA74EB63B3302601F5', 'name': 'centos7-64std', 'os_family': 'Linux', 'type': 'IMAGE'},
+    {'id': '81504C620D98BCEBAA5202D145203B4B', 'name': 'w2012r2datacenter64std', 'os_family': 'Windows', 'type': 'IMAGE'},
+]
+
+_ID_RE = re.compile(r'^[0-9A-F]{32}$')
+
+
+def new_id():
+    return uuid.uuid4().hex.upper()
+
+
+class MockError(Exception):
+
+    def __init__(self, status, message, headers=None):
+        super(MockError, self).__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class MockCloud(object):
+    """
+    In-memory state of an emulated 1&1 account.
+
+    latency: seconds added to every request.
+    deploy_polls: number of GETs, of the resource or of a listing page
+        including it, after which a new resource, or a server changing
+        power state, reaches its settled state, and a deleted resource in
+        REMOVING state disappears.
+    error_rate: probability of answering a request with error_status.
+    throttle_rate: probability of answering a request with 429 and a
+        Retry-After header of retry_after seconds.
+    """
+
+    def __init__(self, latency=0.0, deploy_polls=2, error_rate=0.0,
+                 error_status=500, throttle_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.deploy_polls = deploy_polls
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.resources = dict((collection, {}) for collection in COLLECTIONS)
+        self.logs = []
+        self.polls = {}
+        self.requests = {}
+        self.lock = threading.RLock()
+
+    # Seeding
+
+    def add(self, collection, name, settled=True, **fields):
+        """
+        Adds a resource directly, without counting a request.
+        """
+        initial, ready = COLLECTIONS[collection]
+        resource = {'id': new_id(), 'name': name, 'description': None,
+                    'creation_date': _now()}
+        if collection == 'servers':
+            resource.update(self._server_fields())
+            resource['status'] = {'state': ready if settled else initial, 'percent': None}
+        else:
+            resource['state'] = ready if settled else initial
+        if collection in ('firewall_policies', 'load_balancers'):
+            resource.update({'rules': [], 'server_ips': []})
+        elif collection == 'monitoring_policies':
+            resource.update({'ports': [], 'processes': [], 'servers': [],
+                             'email': None, 'agent': False, 'thresholds': {}})
+        elif collection == 'private_networks':
+            resource.update({'servers': [], 'network_address': None,
+                             'subnet_mask': None, 'datacenter': dict(DATACENTERS[0])})
+        elif collection == 'public_ips':
+            resource.update({'ip': _random_ip(self.random), 'type': 'IPV4',
+                             'reverse_dns': None, 'assigned_to': None})
+        resource.update(fields)
+        with self.lock:
+            self.resources[collection][resource['id']] = resource
+        return resource
+
+    def add_servers(self, count, prefix='bench', **fields):
+        return [self.add('servers', '%s%04d' % (prefix, i + 1), **fields)
+                for i in range(count)]
+
+    def _server_fields(self):
+        return {
+            'datacenter': dict(DATACENTERS[0]),
+            'image': {'id': APPLIANCES[0]['id'], 'name': APPLIANCES[0]['name']},
+            'hardware': {'fixed_instance_size_id': FIXED_INSTANCE_SIZES[0]['id'],
+                         'vcore': 1, 'cores_per_processor': 1, 'ram': 1, 'hdds': []},
+            'ips': [{'id': new_id(), 'ip': _random_ip(self.random), 'type': 'IPV4',
+                     'reverse_dns': None, 'firewall_policy': None,
+                     'load_balancers': []}],
+            'private_networks': None,
+            'monitoring_policy': None,
+            'alerts': [],
+        }
+
+    # Request accounting and fault injection
+
+    def count(self, method, path):
+        endpoint = '%s %s' % (method, '/'.join(
+            '{id}' if _ID_RE.match(part) else part for part in path.split('/')))
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def inject(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            raise MockError(429, 'Too many requests',
+                            {'Retry-After': str(self.retry_after)})
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise MockError(self.error_status, 'Injected failure')
+
+    # State transitions
+
+    def _settle(self, collection, resource):
+        key = (collection, resource['id'])
+        self.polls[key] = self.polls.get(key, 0) + 1
+        if self.polls[key] < self.deploy_polls:
+            return
+        self.polls.pop(key, None)
+
+        if collection == 'servers':
+            state = resource['status']['state']
+        else:
+            state = resource.get('state')
+
+        if state == 'REMOVING':
+            self.resources[collection].pop(resource['id'], None)
+            self._log(collection, resource, 'DELETE')
+        elif collection == 'servers':
+            if state in ('DEPLOYING', 'POWERING_ON'):
+                resource['status']['state'] = 'POWERED_ON'
+            elif state == 'POWERING_OFF':
+                resource['status']['state'] = 'POWERED_OFF'
+        elif state in ('CONFIGURING', 'DEPLOYING'):
+            resource['state'] = COLLECTIONS[collection][1]
+
+    def _log(self, collection, resource, action):
+        self.logs.insert(0, {
+            'id': new_id(),
+            'action': action,
+            'type': LOG_TYPES[collection],
+            'start_date': _now(),
+            'end_date': _now(),
+            'status': {'state': 'OK', 'percent': 100},
+            'resource': {'id': resource['id'], 'name': resource.get('name')},
+        })
+
+    # Endpoints
+
+    def get_collection(self, collection, query):
+        if collection == 'datacenters':
+            return [dict(d) for d in DATACENTERS]
+        if collection == 'server_appliances':
+            return [dict(a) for a in APPLIANCES]
+        if collection == 'logs':
+            items = list(self.logs)
+        else:
+            items = list(self.resources[collection].values())
+            items.sort(key=lambda resource: resource['creation_date'])
+
+        search = _first(query, 'q')
+        if search and collection != 'logs':
+            search = search.lower()
+            items = [i for i in items
+                     if search in (i.get('name') or '').lower() or
+                     search in (i['id'].lower(), (i.get('ip') or '').lower())]
+        elif search:
+            items = [i for i in items if search in (i['action'], i['type'])]
+
+        per_page = _first(query, 'per_page')
+        if per_page:
+            page = int(_first(query, 'page') or 1)
+            per_page = int(per_page)
+            items = items[(page - 1) * per_page:page * per_page]
+        if collection in COLLECTIONS:
+            for item in items:
+                self._settle(collection, item)
+
+        fields = _first(query, 'fields')
+        if fields:
+            keys = set(fields.split(',')) | set(['id'])
+            items = [dict((key, value) for key, value in i.items() if key in keys)
+                     for i in items]
+        return [json.loads(json.dumps(i)) for i in items]
+
+    def get_resource(self, collection, resource_id):
+        resource = self._lookup(collection, resource_id)
+        self._settle(collection, resource)
+        return self._lookup(collection, resource_id)
+
+    def create(self, collection, body):
+        body = body or {}
+        name = body.get('name') or body.get('ip') or new_id()
+        resource = self.add(collection, name, settled=False,
+                            description=body.get('description'))
+        if collection == 'servers':
+            datacenter = _by_id(DATACENTERS, body.get('datacenter_id'))
+            if datacenter:
+                resource['datacenter'] = dict(datacenter)
+            appliance = _by_id(APPLIANCES, body.get('appliance_id'))
+            if appliance:
+                resource['image'] = {'id': appliance['id'], 'name': appliance['name']}
+            resource['first_password'] = new_id()[:12]
+        else:
+            for key in ('rules', 'ports', 'processes'):
+                if isinstance(body.get(key), list):
+                    resource[key] = [self._item(collection, key, i) for i in body[key]]
+            for key in ('email', 'agent', 'thresholds', 'network_address', 'subnet_mask'):
+                if key in body:
+                    resource[key] = body[key]
+        self._log(collection, resource, 'CREATE')
+        return resource
+
+    def update(self, collection, resource_id, body):
+        resource = self._lookup(collection, resource_id)
+        for key, value in (body or {}).items():
+            if value is not None and not isinstance(value, (list, dict)):
+                resource[key] = value
+        return resource
+
+    def delete(self, collection, resource_id):
+        resource = self._lookup(collection, resource_id)
+        if collection == 'servers':
+            resource['status']['state'] = 'REMOVING'
+        else:
+            resource['state'] = 'REMOVING'
+        self.polls.pop((collection, resource['id']), None)
+        self._settle(collection, resource)
+        return resource
+
+    def power(self, resource_id, body):
+        server = self._lookup('servers', resource_id)
+        action = (body or {}).get('action', '').upper()
+        if action == 'POWER_OFF' and server['status']['state'] != 'POWERED_OFF':
+            server['status']['state'] = 'POWERING_OFF'
+        elif action == 'POWER_ON' and server['status']['state'] != 'POWERED_ON':
+            server['status']['state'] = 'POWERING_ON'
+        elif action == 'REBOOT':
+            server['status']['state'] = 'POWERING_ON'
+        return server
+
+    def add_items(self, collection, resource_id, key, body):
+        resource = self._lookup(collection, resource_id)
+        values = body.get(key) if isinstance(body, dict) else body
+        if values is None and isinstance(body, dict):
+            values = next((v for v in body.values() if isinstance(v, list)), [])
+        items = resource.setdefault(key, [])
+        known = set(item['id'] for item in items)
+        for value in values or []:
+            item = self._item(collection, key, value)
+            if item['id'] not in known:
+                items.append(item)
+                known.add(item['id'])
+        return resource
+
+    def get_item(self, collection, resource_id, key, item_id):
+        resource = self._lookup(collection, resource_id)
+        for item in resource.get(key) or []:
+            if item['id'] == item_id:
+                return dict(item)
+        raise MockError(404, 'Item %s not found' % item_id)
+
+    def modify_item(self, collection, resource_id, key, item_id, body):
+        resource = self._lookup(collection, resource_id)
+        for item in resource.get(key) or []:
+            if item['id'] == item_id:
+                item.update(_unwrap(body))
+                return resource
+        raise MockError(404, 'Item %s not found' % item_id)
+
+    def remove_item(self, collection, resource_id, key, item_id):
+        resource = self._lookup(collection, resource_id)
+        items = resource.get(key) or []
+        remaining = [item for item in items if item['id'] != item_id]
+        if len(remaining) == len(items):
+            raise MockError(404, 'Item %s not found' % item_id)
+        resource[key] = remaining
+        return resource
+
+    def _item(self, collection, key, value):
+        if isinstance(value, dict):
+            item = dict(_unwrap(value))
+            for ref in ('server_ip_id', 'server_id'):
+                if ref in item and len(item) == 1:
+                    return self._item(collection, key, item[ref])
+            item.setdefault('id', new_id())
+            return item
+
+        if key == 'server_ips':
+            for server in self.resources['servers'].values():
+                for ip in server['ips'] or []:
+                    if ip['id'] == value:
+                        return {'id': ip['id'], 'ip': ip['ip'],
+                                'server_id': server['id'], 'server_name': server['name']}
+        elif key == 'servers':
+            server = self.resources['servers'].get(value)
+            if server is not None:
+                return {'id': server['id'], 'name': server['name']}
+        raise MockError(400, 'Unknown %s reference %s' % (key, value))
+
+    def _lookup(self, collection, resource_id):
+        resource = self.resources[collection].get(resource_id)
+        if resource is None:
+            raise MockError(404, 'The requested resource does not exist')
+        return resource
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """
+    Routes REST calls to the MockCloud of the server.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        raw = self.rfile.read(length)
+        try:
+            return json.loads(raw.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def _handle(self, method):
+        cloud = self.server.cloud
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split('/') if p]
+        if parts and parts[0] == 'v1':
+            parts = parts[1:]
+        body = self._read_body()
+        cloud.count(method, '/'.join(parts))
+
+        try:
+            if not self.headers.get('X-TOKEN'):
+                raise MockError(401, 'Missing X-TOKEN header')
+            cloud.inject()
+            with cloud.lock:
+                status, payload = self._route(cloud, method, parts, query, body)
+            self._send(status, payload)
+        except MockError as e:
+            self._send(e.status, {'type': 'ERROR', 'message': e.message}, e.headers)
+
+    def _route(self, cloud, method, parts, query, body):
+        if not parts:
+            raise MockError(404, 'Not found')
+        collection = parts[0]
+
+        if collection == 'servers' and parts[1:] == ['fixed_instance_sizes']:
+            return 200, [dict(f) for f in FIXED_INSTANCE_SIZES]
+        if collection in ('datacenters', 'server_appliances', 'logs') and len(parts) == 1:
+            return 200, cloud.get_collection(collection, query)
+        if collection not in COLLECTIONS:
+            raise MockError(404, 'Unknown endpoint /%s' % '/'.join(parts))
+
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, cloud.get_collection(collection, query)
+            if method == 'POST':
+                return 202, cloud.create(collection, body)
+        elif len(parts) == 2:
+            if method == 'GET':
+                return 200, cloud.get_resource(collection, parts[1])
+            if method == 'PUT':
+                return 202, cloud.update(collection, parts[1], body)
+            if method == 'DELETE':
+                return 202, cloud.delete(collection, parts[1])
+        elif collection == 'servers' and parts[2] == 'status':
+            if method == 'PUT':
+                return 202, cloud.power(parts[1], body)
+            return 200, cloud.get_resource(collection, parts[1])['status']
+        elif len(parts) == 3:
+            if method == 'GET':
+                return 200, cloud.get_resource(collection, parts[1]).get(parts[2]) or []
+            if method == 'POST':
+                return 202, cloud.add_items(collection, parts[1], parts[2], body)
+        elif len(parts) == 4:
+            if method == 'GET':
+                return 200, cloud.get_item(collection, parts[1], parts[2], parts[3])
+            if method == 'PUT':
+                return 202, cloud.modify_item(collection, parts[1], parts[2], parts[3], body)
+            if method == 'DELETE':
+                return 202, cloud.remove_item(collection, parts[1], parts[2], parts[3])
+
+        raise MockError(405, 'Method %s not allowed on /%s' % (method, '/'.join(parts)))
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockAPIServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, cloud, host='127.0.0.1', port=0):
+        HTTPServer.__init__(self, (host, port), MockAPIHandler)
+        self.cloud = cloud
+
+    def handle_error(self, request, client_address):
+        # Clients dropping their keep-alive connections are not errors.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            HTTPServer.handle_error(self, request, client_address)
+
+    @property
+    def api_url(self):
+        return 'http://%s:%d/v1' % self.server_address[:2]
+
+
+def start_server(cloud, host='127.0.0.1', port=0):
+    """
+    Serves the cloud from a background thread. Returns the server, whose
+    api_url is ready to be used as the modules' api_url parameter.
+    """
+    server = MockAPIServer(cloud, host, port)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()) + '.%06dZ' % (time.time() % 1 * 1e6)
+
+
+def _first(query, key):
+    values = query.get(key)
+    if values:
+        return values[0]
+
+
+def _by_id(items, item_id):
+    for item in items:
+        if item['id'] == item_id:
+            return item
+
+
+def _unwrap(value):
+    if isinstance(value, dict) and len(value) == 1:
+        inner = list(value.values())[0]
+        if isinstance(inner, dict):
+            return inner
+    return value or {}
+
+
+def _random_ip(rng):
+    return '10.%d.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--servers', type=int, default=0,
+                        help='number of powered on servers to start with')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every request')
+    parser.add_argument('--deploy-polls', type=int, default=2,
+                        help='GETs until a new resource settles')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    cloud = MockCloud(latency=args.latency, deploy_polls=args.deploy_polls,
+                      error_rate=args.error_rate, error_status=args.error_status,
+                      throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    cloud.add_servers(args.servers)
+    server = MockAPIServer(cloud, args.host, args.port)
+    print('Serving the mock 1&1 API at %s' % server.api_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        total = cloud.total_requests()
+        for endpoint, count in sorted(cloud.requests.items()):
+            print('%6d  %s' % (count, endpoint))
+        print('%6d  total' % total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks the oneandone_* modules against the local mock API.
+
+Each scenario seeds a fresh mock account, runs one module operation
+through the real 1&1 SDK at every requested scale and reports the wall
+time, the API calls made by the module, the HTTP requests seen by the
+mock server and the time spent sleeping in wait loops.
+
+Requires Ansible and the 1and1 SDK to be installed:
+
+    python benchmarks/run.py --scales 10,100,1000
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import mock_api
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_source(name, path):
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_modules():
+    """
+    Loads module_utils and the modules from this checkout. The modules
+    directory is not put on sys.path, where its package would shadow the
+    1and1 SDK.
+    """
+    import ansible.module_utils
+    module_utils = _load_source('ansible.module_utils.oneandone',
+                                os.path.join(REPO_ROOT, 'module_utils', 'oneandone.py'))
+    ansible.module_utils.oneandone = module_utils
+
+    modules = {}
+    for name in ('server', 'firewall_policy', 'load_balancer',
+                 'monitoring_policy', 'private_network'):
+        modules[name] = _load_source(
+            'oneandone_%s' % name,
+            os.path.join(REPO_ROOT, 'oneandone', 'oneandone_%s.py' % name))
+    return module_utils, modules
+
+
+class BenchmarkFailure(Exception):
+    pass
+
+
+class BenchmarkModule(object):
+    """
+    Minimal stand-in for AnsibleModule carrying the task parameters.
+    """
+
+    def __init__(self, params):
+        self.params = params
+
+    def fail_json(self, **kwargs):
+        raise BenchmarkFailure(kwargs.get('msg'))
+
+    def exit_json(self, **kwargs):
+        return kwargs
+
+
+COMMON_PARAMS = {
+    'auth_token': 'benchmark-token',
+    'wait': True,
+    'wait_timeout': 1800,
+    'wait_interval': 1,
+    'perf': True,
+}
+
+
+def _server_names(servers):
+    return [server['name'] for server in servers]
+
+
+def setup_create_machine(cloud, scale):
+    return {
+        'hostname': 'bench%02d',
+        'description': None,
+        'auto_increment': True,
+        'count': scale,
+        'fixed_instance_size': 'S',
+        'appliance': 'ubuntu1604-64std',
+        'datacenter': 'US',
+        'max_concurrency': 10,
+    }
+
+
+def setup_recreate_machine(cloud, scale):
+    cloud.add_servers(scale)
+    return dict(setup_create_machine(cloud, scale),
+                hostname='bench%04d',
+                exact_count=True)
+
+
+def setup_startstop_machine(cloud, scale):
+    return {'state': 'stopped',
+            'instance_ids': _server_names(cloud.add_servers(scale))}
+
+
+def setup_remove_machine(cloud, scale):
+    return {'state': 'absent',
+            'keep_hdds': False,
+            'max_concurrency': 10,
+            'instance_ids': _server_names(cloud.add_servers(scale))}
+
+
+def setup_update_firewall_policy(cloud, scale):
+    cloud.add('firewall_policies', 'bench-firewall')
+    return {'firewall_policy': 'bench-firewall',
+            'add_server_ips': _server_names(cloud.add_servers(scale))}
+
+
+def setup_update_load_balancer(cloud, scale):
+    cloud.add('load_balancers', 'bench-lb')
+    return {'load_balancer': 'bench-lb',
+            'add_server_ips': _server_names(cloud.add_servers(scale))}
+
+
+def setup_update_monitoring_policy(cloud, scale):
+    cloud.add('monitoring_policies', 'bench-monitoring')
+    return {'monitoring_policy': 'bench-monitoring',
+            'add_servers': _server_names(cloud.add_servers(scale))}
+
+
+def setup_update_network(cloud, scale):
+    cloud.add('private_networks', 'bench-network')
+    return {'private_network': 'bench-network',
+            'add_members': _server_names(cloud.add_servers(scale))}
+
+
+# Scenario name -> (module, function, setup returning the task parameters).
+SCENARIOS = [
+    ('create_machine', 'server', 'create_machine', setup_create_machine),
+    ('recreate_machine', 'server', 'create_machine', setup_recreate_machine),
+    ('startstop_machine', 'server', 'startstop_machine', setup_startstop_machine),
+    ('remove_machine', 'server', 'remove_machine', setup_remove_machine),
+    ('update_firewall_policy', 'firewall_policy', 'update_firewall_policy', setup_update_firewall_policy),
+    ('update_load_balancer', 'load_balancer', 'update_load_balancer', setup_update_load_balancer),
+    ('update_monitoring_policy', 'monitoring_policy', 'update_monitoring_policy', setup_update_monitoring_policy),
+    ('update_network', 'private_network', 'update_network', setup_update_network),
+]
+
+
+def _warm_mirror(module_utils, params):
+    """
+    Fills the resource mirror with every collection it keeps, as earlier
+    tasks would have, outside of the measured run.
+    """
+    oneandone_conn = module_utils.get_oneandone_connection(BenchmarkModule(dict(params, perf=False)))
+    mirror = module_utils.get_resource_index(oneandone_conn).mirror
+    for collection in sorted(set(module_utils.MIRROR_LOG_TYPES.values())):
+        mirror.resources(collection)
+
+
+def run_scenario(module_utils, modules, scenario, scale, cloud_options, extra_params=None):
+    name, module_name, function_name, setup = scenario
+    cloud = mock_api.MockCloud(**cloud_options)
+    server = mock_api.start_server(cloud)
+    mirror_dir = tempfile.mkdtemp(prefix='oneandone-bench-')
+    try:
+        params = dict(COMMON_PARAMS, api_url=server.api_url, **(extra_params or {}))
+        params.update(setup(cloud, scale))
+        if params.get('mirror_max_age') is not None:
+            params['mirror_file'] = os.path.join(mirror_dir, 'mirror.sqlite')
+            _warm_mirror(module_utils, params)
+            cloud.requests.clear()
+        module = BenchmarkModule(params)
+        oneandone_conn = module_utils.get_oneandone_connection(module)
+
+        error = None
+        started = time.time()
+        try:
+            getattr(modules[module_name], function_name)(module, oneandone_conn)
+        except BenchmarkFailure as e:
+            error = str(e)
+        wall_time = time.time() - started
+
+        perf = module_utils.report_perf(module, oneandone_conn)['perf']
+        return {
+            'scenario': name,
+            'scale': scale,
+            'wall_time': round(wall_time, 3),
+            'api_calls': perf['api_calls'],
+            'http_requests': cloud.total_requests(),
+            'sleep_time': perf['sleep_time'],
+            'calls': dict((call, stats['count']) for call, stats in perf['calls'].items()),
+            'error': error,
+        }
+    finally:
+        # Close the keep-alive connections so the server threads can end.
+        session = module_utils.install_http_session(module_utils.oneandone.client)
+        if session is not None:
+            session.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(mirror_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='10,100,1000',
+                        help='comma separated numbers of resources per scenario')
+    parser.add_argument('--scenarios', default=','.join(s[0] for s in SCENARIOS),
+                        help='comma separated scenarios to run')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the mock API adds to every request')
+    parser.add_argument('--deploy-polls', type=int, default=1,
+                        help='GETs until a new resource settles')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='share of requests the mock API rejects with 429')
+    parser.add_argument('--retry-after', type=int, default=1,
+                        help='Retry-After seconds of the rejected requests')
+    parser.add_argument('--rate-limit', type=float,
+                        help='rate_limit parameter passed to the modules')
+    parser.add_argument('--mirror-max-age', type=int,
+                        help='mirror_max_age parameter passed to the modules, '
+                             'with the mirror filled before each run')
+    parser.add_argument('--json', dest='json_path',
+                        help='also write the results to this file')
+    args = parser.parse_args()
+
+    module_utils, modules = load_modules()
+    cloud_options = {'latency': args.latency,
+                     'deploy_polls': args.deploy_polls,
+                     'error_rate': args.error_rate,
+                     'throttle_rate': args.throttle_rate,
+                     'retry_after': args.retry_after,
+                     'seed': 0}
+    selected = args.scenarios.split(',')
+    unknown = set(selected) - set(s[0] for s in SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: %s' % ', '.join(sorted(unknown)))
+
+    results = []
+    print('%-26s %6s %10s %10s %10s %10s' % ('scenario', 'scale', 'wall (s)',
+                                             'api calls', 'http reqs', 'sleep (s)'))
+    for scenario in SCENARIOS:
+        if scenario[0] not in selected:
+            continue
+        for scale in [int(s) for s in args.scales.split(',')]:
+            result = run_scenario(module_utils, modules, scenario, scale, cloud_options,
+                                  {'rate_limit': args.rate_limit,
+                                   'mirror_max_age': args.mirror_max_age})
+            results.append(result)
+            print('%-26s %6d %10.3f %10d %10d %10.3f%s' % (
+                result['scenario'], result['scale'], result['wall_time'],
+                result['api_calls'], result['http_requests'], result['sleep_time'],
+                '  FAILED: %s' % result['error'] if result['error'] else ''))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if any(result['error'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
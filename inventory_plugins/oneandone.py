@@ -0,0 +1,616 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: oneandone
+    plugin_type: inventory
+    short_description: 1&1 Cloud Server inventory source
+    description:
+        - Builds hosts and groups from the servers of a 1&1 account, with one paginated listing.
+        - The servers are cached on disk. Within cache_ttl the cache is used as is. Once it expires,
+          only the servers named in the audit log since the last synchronization are fetched again,
+          along with the servers assigned to the firewall policies, load balancers, private networks
+          and public IPs it names. All servers are listed again when the log shows too many changes.
+        - API calls share one keep-alive connection. Requests rejected with 429 Too Many Requests
+          are sent again after the delay the API asks for, and failed ones are retried.
+        - Uses a YAML configuration file that ends with oneandone.yml or oneandone.yaml.
+        - This plugin has a dependency on 1and1 >= 1.0
+    version_added: "2.4"
+    options:
+        plugin:
+            description: Token that ensures this is a source file for the plugin.
+            required: True
+            choices: ['oneandone']
+        auth_token:
+            description:
+                - Authenticating API token provided by 1&1. Overrides the
+                  ONEANDONE_AUTH_TOKEN environment variable.
+            required: True
+        api_url:
+            description:
+                - Custom API URL. Overrides the ONEANDONE_API_URL environment variable.
+            required: False
+        hostnames:
+            description:
+                - Server attribute used as inventory hostname.
+            choices: ['name', 'public_ipv4', 'id']
+            default: name
+        groups:
+            description:
+                - Server attributes the hosts are grouped by, in groups named after the attribute
+                  and its value, such as datacenter_US or firewall_policy_web.
+            type: list
+            default: ['datacenter', 'appliance', 'firewall_policy', 'load_balancer', 'private_network']
+        cache:
+            description:
+                - Keep the servers in an on-disk cache between runs.
+            type: bool
+            default: True
+        cache_ttl:
+            description:
+                - Number of seconds the cache is used without checking the audit log.
+            default: 300
+        cache_dir:
+            description:
+                - Directory of the on-disk cache.
+            default: ~/.ansible/cache/oneandone
+        rate_limit:
+            description:
+                - Maximum number of API requests per second. Overrides the ONEANDONE_RATE_LIMIT
+                  environment variable.
+            required: False
+    requirements:
+        - "1and1"
+        - "python >= 2.6"
+'''
+
+EXAMPLES = '''
+# oneandone.yml
+plugin: oneandone
+cache_ttl: 600
+groups:
+  - datacenter
+  - firewall_policy
+
+# Address the hosts by their public IPv4 address, without a cache.
+plugin: oneandone
+hostnames: public_ipv4
+cache: false
+'''
+
+import calendar
+import email.utils
+import errno
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+from ansible.errors import AnsibleError, AnsibleParserError
+from ansible.plugins.inventory import BaseInventoryPlugin
+
+HAS_ONEANDONE_SDK = True
+
+try:
+    import oneandone.client
+except ImportError:
+    HAS_ONEANDONE_SDK = False
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+# Inventory plugins run on the controller, where the module_utils of this
+# repository cannot be imported: Ansible only ships them along with the
+# modules. The pager, the audit log date parsing and periods, the atomic
+# cache write and the HTTP session setup below are therefore minimal
+# copies of their module_utils counterparts, and must be kept in line
+# with them.
+
+GROUPINGS = ('datacenter', 'appliance', 'firewall_policy', 'load_balancer', 'private_network')
+
+HTTP_POOL_SIZE = 10
+RATE_LIMIT_RETRIES = 6
+RATE_LIMIT_BACKOFF_CAP = 30
+RETRY_STATUSES = (502, 503, 504)
+
+PAGE_SIZE = 1000
+LOG_PAGE_SIZE = 100
+LOG_CLOCK_SKEW = 300
+
+# Audit log periods, with their length in seconds, in which the changes
+# since the last synchronization are looked up.
+LOG_PERIODS = (
+    ('LAST_HOUR', 3600),
+    ('LAST_24H', 86400),
+    ('LAST_7D', 604800),
+)
+
+# Log types of the resources whose changes may move servers between
+# groups or change their addresses. The servers assigned to them, before
+# and after the change, are fetched again.
+RELATED_LOG_TYPES = ('FIREWALL', 'LOADBALANCER', 'PRIVATENETWORK', 'IP')
+
+# Above this number of changed servers, or of changed related resources,
+# a full listing is cheaper than fetching them one by one.
+INCREMENTAL_REFRESH_LIMIT = 20
+
+# Servers in these states are fetched again on every refresh, since the
+# end of a transition is not logged.
+TRANSITIONAL_STATES = ('DEPLOYING', 'POWERING_ON', 'POWERING_OFF', 'REBOOTING',
+                       'CONFIGURING', 'REMOVING')
+
+
+def _iterate_pages(list_method, per_page, **kwargs):
+    page = 1
+    while True:
+        resources = list_method(page=page, per_page=per_page, **kwargs)
+        for resource in resources:
+            yield resource
+        if len(resources) < per_page:
+            return
+        page += 1
+
+
+def _parse_log_date(value):
+    try:
+        return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_not_found(error):
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status == 404 or 'Error Code: 404' in str(error)
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, email.utils.mktime_tz(date) - time.time())
+
+
+class _RateLimiter(object):
+    """
+    Token bucket limiting the requests per second of this process.
+    """
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.burst = max(1.0, self.rate)
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    def acquire(self):
+        while True:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + max(0, now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class _SessionRequests(object):
+    """
+    Stands in for the requests module inside the SDK client, so that its
+    module level calls go through the shared session.
+    """
+
+    SESSION_METHODS = ('request', 'get', 'options', 'head',
+                       'post', 'put', 'patch', 'delete')
+
+    def __init__(self, requests_module, session):
+        self._requests = requests_module
+        self.session = session
+
+    def __getattr__(self, name):
+        if name in self.SESSION_METHODS:
+            return getattr(self.session, name)
+        return getattr(self._requests, name)
+
+
+def _install_http_session(client_module):
+    """
+    Routes the HTTP calls of the SDK client module through one keep-alive
+    session, as install_http_session does for the modules. The SDK's
+    retrying adapter is kept and extended to RETRY_STATUSES, requests wait
+    for the session's rate_limiter, if one is set, and requests rejected
+    with 429 are sent again after the delay the API asks for. Returns the
+    session, or None if the client cannot be patched.
+    """
+    sdk_requests = getattr(client_module, 'requests', None)
+    if requests is None or sdk_requests is None:
+        return None
+    if isinstance(sdk_requests, _SessionRequests):
+        return sdk_requests.session
+
+    session = requests.Session()
+    retry_session = getattr(client_module, 'requests_retry_session', None)
+    if retry_session is not None:
+        retry_session(session=session)
+        for adapter in set(session.adapters.values()):
+            adapter.init_poolmanager(HTTP_POOL_SIZE, HTTP_POOL_SIZE)
+            retries = adapter.max_retries
+            adapter.max_retries = retries.new(
+                status_forcelist=set(retries.status_forcelist or ()) | set(RETRY_STATUSES))
+
+    send = session.send
+
+    def throttled_send(request, **kwargs):
+        delay = 1
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if session.rate_limiter is not None:
+                session.rate_limiter.acquire()
+
+            response = send(request, **kwargs)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                return response
+
+            retry_after = _retry_after(response)
+            if retry_after is None:
+                retry_after = random.uniform(delay / 2.0, delay)
+                delay = min(delay * 2, RATE_LIMIT_BACKOFF_CAP)
+            response.close()
+            time.sleep(retry_after)
+
+    session.rate_limiter = None
+    session.send = throttled_send
+
+    def shared_retry_session(*args, **kwargs):
+        return session
+
+    client_module.requests_retry_session = shared_retry_session
+    client_module.requests = _SessionRequests(sdk_requests, session)
+    return session
+
+
+def _reference_ids(value):
+    """
+    Returns the IDs of a reference or a list of references.
+    """
+    if not value:
+        return []
+    if isinstance(value, dict):
+        value = [value]
+    return [item.get('id') for item in value if isinstance(item, dict)]
+
+
+def _names(value):
+    """
+    Returns the names of a reference or a list of references.
+    """
+    if not value:
+        return []
+    if isinstance(value, dict):
+        value = [value]
+    return [item.get('name') or item.get('id') for item in value if isinstance(item, dict)]
+
+
+def _group_memberships(server):
+    """
+    Returns the (grouping, value) pairs of a server.
+    """
+    memberships = []
+    datacenter = server.get('datacenter') or {}
+    if datacenter.get('country_code'):
+        memberships.append(('datacenter', datacenter['country_code']))
+    for name in _names(server.get('image')):
+        memberships.append(('appliance', name))
+    for ip in server.get('ips') or []:
+        for name in _names(ip.get('firewall_policy')):
+            memberships.append(('firewall_policy', name))
+        for name in _names(ip.get('load_balancers')):
+            memberships.append(('load_balancer', name))
+    for name in _names(server.get('private_networks')):
+        memberships.append(('private_network', name))
+    return memberships
+
+
+def _host_vars(server):
+    host_vars = {
+        'oneandone_id': server['id'],
+        'oneandone_name': server.get('name'),
+        'oneandone_description': server.get('description'),
+        'oneandone_state': (server.get('status') or {}).get('state'),
+        'oneandone_datacenter': (server.get('datacenter') or {}).get('country_code'),
+        'oneandone_appliance': (server.get('image') or {}).get('name'),
+    }
+    for addr_data in server.get('ips') or []:
+        if addr_data.get('type') == 'IPV6':
+            host_vars['public_ipv6'] = addr_data['ip']
+        elif addr_data.get('type') == 'IPV4':
+            host_vars['public_ipv4'] = addr_data['ip']
+    if 'public_ipv4' in host_vars:
+        host_vars['ansible_host'] = host_vars['public_ipv4']
+    return host_vars
+
+
+class InventoryModule(BaseInventoryPlugin):
+
+    NAME = 'oneandone'
+
+    def verify_file(self, path):
+        if super(InventoryModule, self).verify_file(path):
+            return path.endswith(('oneandone.yml', 'oneandone.yaml'))
+        return False
+
+    def _cache_path(self, config, auth_token, api_url):
+        namespace = hashlib.sha1(('%s|%s' % (api_url, auth_token)).encode('utf-8')).hexdigest()
+        return os.path.join(os.path.expanduser(config.get('cache_dir', '~/.ansible/cache/oneandone')),
+                            'oneandone-%s-inventory.json' % namespace)
+
+    def _load_cache(self, cache_path):
+        try:
+            with open(cache_path) as cache_file:
+                cached = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (not isinstance(cached, dict) or not isinstance(cached.get('servers'), dict) or
+                not isinstance(cached.get('synced'), (int, float))):
+            return None
+        return cached
+
+    def _store_cache(self, cache_path, cached):
+        """
+        Atomically replaces the cache. Failures are ignored, the cache
+        being an optimization only.
+        """
+        cache_dir = os.path.dirname(cache_path)
+        try:
+            os.makedirs(cache_dir, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.oneandone-')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(cached, tmp_file)
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _list_servers(self, oneandone_conn):
+        return dict((server['id'], server)
+                    for server in _iterate_pages(oneandone_conn.list_servers, PAGE_SIZE))
+
+    def _referencing_server_ids(self, servers, log_type, resource_id):
+        """
+        Returns the IDs of the cached servers that refer to the resource.
+        """
+        server_ids = set()
+        for server_id, server in servers.items():
+            references = []
+            if log_type == 'PRIVATENETWORK':
+                references = _reference_ids(server.get('private_networks'))
+            for ip in server.get('ips') or []:
+                if log_type == 'FIREWALL':
+                    references.extend(_reference_ids(ip.get('firewall_policy')))
+                elif log_type == 'LOADBALANCER':
+                    references.extend(_reference_ids(ip.get('load_balancers')))
+                elif log_type == 'IP':
+                    references.append(ip.get('id'))
+            if resource_id in references:
+                server_ids.add(server_id)
+        return server_ids
+
+    def _assigned_server_ids(self, oneandone_conn, servers, log_type, resource_id):
+        """
+        Returns the IDs of the servers the resource is assigned to now.
+        """
+        try:
+            if log_type == 'PRIVATENETWORK':
+                return set(server['id'] for server in
+                           oneandone_conn.list_private_network_servers(private_network_id=resource_id) or [])
+            if log_type == 'IP':
+                assigned_to = oneandone_conn.get_public_ip(ip_id=resource_id).get('assigned_to') or {}
+                if assigned_to.get('type', 'SERVER') == 'SERVER' and assigned_to.get('id'):
+                    return set([assigned_to['id']])
+                return set()
+            if log_type == 'FIREWALL':
+                server_ips = oneandone_conn.list_firewall_servers(firewall_id=resource_id)
+            else:
+                server_ips = oneandone_conn.list_load_balancer_servers(load_balancer_id=resource_id)
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+            return set()
+
+        # The assigned server IPs are mapped to the cached servers holding
+        # them; servers created since are named in the log on their own.
+        ip_servers = dict((ip.get('id'), server_id) for server_id, server in servers.items()
+                          for ip in server.get('ips') or [])
+        server_ids = set()
+        for server_ip in server_ips or []:
+            server_id = server_ip.get('server_id') or ip_servers.get(server_ip.get('id'))
+            if server_id:
+                server_ids.add(server_id)
+        return server_ids
+
+    def _changed_server_ids(self, oneandone_conn, servers, synced):
+        """
+        Returns the IDs of the servers named in the audit log since the
+        synced time, or assigned to the firewall policies, load balancers,
+        private networks and public IPs it names, before or after their
+        changes. Returns None if all servers must be listed again.
+        """
+        period = None
+        for log_period, seconds in LOG_PERIODS:
+            if time.time() - synced + LOG_CLOCK_SKEW < seconds:
+                period = log_period
+                break
+        if period is None:
+            return None
+
+        oldest = synced - LOG_CLOCK_SKEW
+        changed = set()
+        related = set()
+        for log in _iterate_pages(oneandone_conn.list_logs, LOG_PAGE_SIZE,
+                                  period=period, sort='-start_date'):
+            started = _parse_log_date(log.get('start_date'))
+            if started is not None and started < oldest:
+                break
+            if not log.get('resource'):
+                continue
+            if log.get('type') in RELATED_LOG_TYPES:
+                related.add((log['type'], log['resource']['id']))
+            elif log.get('type') == 'VM':
+                changed.add(log['resource']['id'])
+
+        if len(related) > INCREMENTAL_REFRESH_LIMIT:
+            return None
+        for log_type, resource_id in related:
+            changed.update(self._referencing_server_ids(servers, log_type, resource_id))
+            changed.update(self._assigned_server_ids(oneandone_conn, servers, log_type, resource_id))
+        return changed
+
+    def _refresh_servers(self, oneandone_conn, servers, synced):
+        """
+        Brings the cached servers up to date from the audit log. Returns
+        None if all servers must be listed again.
+        """
+        changed = self._changed_server_ids(oneandone_conn, servers, synced)
+        if changed is None:
+            return None
+
+        changed.update(server_id for server_id, server in servers.items()
+                       if (server.get('status') or {}).get('state') in TRANSITIONAL_STATES)
+        if len(changed) > INCREMENTAL_REFRESH_LIMIT:
+            return None
+
+        servers = dict(servers)
+        for server_id in changed:
+            try:
+                servers[server_id] = oneandone_conn.get_server(server_id)
+            except Exception as e:
+                if not _is_not_found(e):
+                    raise
+                servers.pop(server_id, None)
+        return servers
+
+    def _get_servers(self, config, use_cache):
+        auth_token = config.get('auth_token') or os.environ.get('ONEANDONE_AUTH_TOKEN')
+        api_url = config.get('api_url') or os.environ.get('ONEANDONE_API_URL')
+        if not auth_token:
+            raise AnsibleError('The "auth_token" option or ONEANDONE_AUTH_TOKEN '
+                               'environment variable is required.')
+
+        session = _install_http_session(oneandone.client)
+        rate_limit = config.get('rate_limit') or os.environ.get('ONEANDONE_RATE_LIMIT')
+        if session is not None:
+            session.rate_limiter = None
+            if rate_limit and float(rate_limit) > 0:
+                session.rate_limiter = _RateLimiter(rate_limit)
+
+        if api_url:
+            oneandone_conn = oneandone.client.OneAndOneService(api_token=auth_token, api_url=api_url)
+        else:
+            oneandone_conn = oneandone.client.OneAndOneService(api_token=auth_token)
+
+        if not config.get('cache', True):
+            return self._list_servers(oneandone_conn)
+
+        cache_path = self._cache_path(config, auth_token, api_url)
+        cached = self._load_cache(cache_path)
+        started = time.time()
+        if cached is not None and use_cache and started - cached['synced'] < config.get('cache_ttl', 300):
+            return cached['servers']
+
+        servers = None
+        if cached is not None:
+            servers = self._refresh_servers(oneandone_conn, cached['servers'], cached['synced'])
+        if servers is None:
+            servers = self._list_servers(oneandone_conn)
+
+        self._store_cache(cache_path, {'synced': started, 'servers': servers})
+        return servers
+
+    def _add_server(self, server, hostnames, groupings):
+        host_vars = _host_vars(server)
+        if hostnames == 'public_ipv4':
+            hostname = host_vars.get('public_ipv4')
+        elif hostnames == 'id':
+            hostname = server['id']
+        else:
+            hostname = server.get('name')
+        if not hostname:
+            return
+
+        self.inventory.add_host(hostname, group='oneandone')
+        for key, value in host_vars.items():
+            self.inventory.set_variable(hostname, key, value)
+
+        for grouping, value in _group_memberships(server):
+            if grouping in groupings:
+                group = re.sub(r'[^A-Za-z0-9_]', '_', '%s_%s' % (grouping, value))
+                self.inventory.add_group(group)
+                self.inventory.add_host(hostname, group=group)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path)
+
+        if not HAS_ONEANDONE_SDK:
+            raise AnsibleError('1and1 required for this inventory plugin')
+
+        try:
+            config = self.loader.load_from_file(path)
+        except Exception as e:
+            raise AnsibleParserError(str(e))
+        if not config or config.get('plugin') != self.NAME:
+            raise AnsibleParserError('%s is not a oneandone inventory source' % path)
+
+        groupings = config.get('groups', GROUPINGS)
+        unknown = set(groupings) - set(GROUPINGS)
+        if unknown:
+            raise AnsibleParserError('unknown groups %s, expected some of %s' % (
+                ', '.join(sorted(unknown)), ', '.join(GROUPINGS)))
+
+        hostnames = config.get('hostnames', 'name')
+        if hostnames not in ('name', 'public_ipv4', 'id'):
+            raise AnsibleParserError('hostnames must be one of name, public_ipv4 or id')
+
+        try:
+            servers = self._get_servers(config, cache)
+        except AnsibleError:
+            raise
+        except Exception as e:
+            raise AnsibleError('failed to list the 1&1 servers: %s' % str(e))
+
+        self.inventory.add_group('oneandone')
+        for server_id in sorted(servers, key=lambda server_id: servers[server_id].get('name') or ''):
+            self._add_server(servers[server_id], hostnames, groupings)
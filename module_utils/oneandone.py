@@ -0,0 +1,1475 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Helpers shared by the oneandone_* modules.
+"""
+
+from __future__ import absolute_import
+
+import calendar
+import email.utils
+import errno
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import weakref
+from multiprocessing.pool import ThreadPool
+
+HAS_ONEANDONE_SDK = True
+
+try:
+    import oneandone.client
+except ImportError:
+    HAS_ONEANDONE_SDK = False
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+HAS_SQLITE3 = True
+
+try:
+    import sqlite3
+except ImportError:
+    HAS_SQLITE3 = False
+
+HAS_REQUESTS = True
+
+try:
+    import requests
+    import requests.adapters
+except ImportError:
+    HAS_REQUESTS = False
+
+# Collection name -> (listing method, listing arguments, indexed keys,
+# get method, whether the listing is paginated). Collections with a get
+# method support targeted lookups by ID and by name search.
+RESOURCE_COLLECTIONS = {
+    'datacenters': ('list_datacenters', {}, ('id', 'country_code'), None, False),
+    'fixed_instance_sizes': ('fixed_server_flavors', {}, ('id', 'name'), None, False),
+    'appliances': ('list_appliances', {'q': 'IMAGE'}, ('id', 'name'), None, False),
+    'servers': ('list_servers', {}, ('id', 'name'), 'get_server', True),
+    'private_networks': ('list_private_networks', {}, ('id', 'name'), 'get_private_network', True),
+    'monitoring_policies': ('list_monitoring_policies', {}, ('id', 'name'), 'get_monitoring_policy', True),
+    'firewall_policies': ('list_firewall_policies', {}, ('id', 'name'), 'get_firewall', True),
+    'load_balancers': ('list_load_balancers', {}, ('id', 'name'), 'get_load_balancer', True),
+    'vpns': ('list_vpns', {}, ('id', 'name'), 'get_vpn', True),
+    'users': ('list_users', {}, ('id', 'name'), 'get_user', True),
+    'roles': ('list_roles', {}, ('id', 'name'), 'get_role', True),
+    'public_ips': ('list_public_ips', {}, ('id', 'ip'), 'get_public_ip', True),
+}
+
+# 1&1 resource IDs are 32 upper-case hexadecimal characters.
+RESOURCE_ID_RE = re.compile(r'^[0-9A-F]{32}$')
+
+# Page sizes of full listings and of name searches, and the number of
+# identifiers above which a bulk lookup lists the whole collection once
+# instead of looking each identifier up.
+PAGE_SIZE = 1000
+SEARCH_PAGE_SIZE = 100
+BULK_LOOKUP_THRESHOLD = 10
+
+# Collections that rarely change and may be kept in the on-disk catalog cache.
+CATALOG_COLLECTIONS = ('datacenters', 'fixed_instance_sizes', 'appliances')
+
+# Resource type -> (get method, path to the state, ready states, transitional
+# states, name used in messages). Any state not listed fails the wait.
+RESOURCE_STATES = {
+    'server': ('get_server', ('status', 'state'),
+               ('POWERED_ON',), ('ACTIVE', 'ENABLED', 'DEPLOYING'), 'machine'),
+    'firewall_policy': ('get_firewall', ('state',),
+                        ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'firewall policy'),
+    'load_balancer': ('get_load_balancer', ('state',),
+                      ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'load balancer'),
+    'monitoring_policy': ('get_monitoring_policy', ('state',),
+                          ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'monitoring policy'),
+    'private_network': ('get_private_network', ('state',),
+                        ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'network'),
+    'public_ip': ('get_public_ip', ('state',),
+                  ('ACTIVE',), ('CONFIGURING',), 'public IP'),
+    'vpn': ('get_vpn', ('state',),
+            ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'VPN'),
+    'user': ('get_user', ('state',),
+             ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'user'),
+    'role': ('get_role', ('state',),
+             ('ACTIVE',), ('ENABLED', 'DEPLOYING', 'CONFIGURING'), 'role'),
+}
+
+# Polling starts WAIT_BACKOFF_BASE seconds after the first check and doubles
+# up to WAIT_BACKOFF_CAP_FACTOR times the wait_interval parameter.
+WAIT_BACKOFF_BASE = 1
+WAIT_BACKOFF_CAP_FACTOR = 4
+
+# Page size used when scanning the audit log, and the tolerated clock skew
+# between this host and the API when comparing log dates.
+LOG_PAGE_SIZE = 100
+LOG_CLOCK_SKEW = 300
+
+# Audit log periods, with their length in seconds, in which the changes
+# since a given time are looked up.
+LOG_PERIODS = (
+    ('LAST_HOUR', 3600),
+    ('LAST_24H', 86400),
+    ('LAST_7D', 604800),
+)
+
+# Audit log type -> collection kept in the resource mirror. Collections
+# with more than MIRROR_REPLAY_LIMIT changed resources in the log are
+# listed again rather than fetched one by one. Forks wait up to
+# MIRROR_LOCK_TIMEOUT seconds for another one updating the mirror.
+MIRROR_LOG_TYPES = {
+    'VM': 'servers',
+    'IP': 'public_ips',
+    'FIREWALL': 'firewall_policies',
+    'LOADBALANCER': 'load_balancers',
+    'MONITORING_POLICY': 'monitoring_policies',
+    'PRIVATENETWORK': 'private_networks',
+    'VPN': 'vpns',
+    'USER': 'users',
+    'ROLE': 'roles',
+}
+MIRROR_REPLAY_LIMIT = 20
+MIRROR_LOCK_TIMEOUT = 120
+
+MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_state (key TEXT PRIMARY KEY, value REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS resources (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id));
+CREATE TABLE IF NOT EXISTS resource_keys (
+    collection TEXT NOT NULL,
+    value TEXT NOT NULL,
+    id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS resource_keys_value ON resource_keys (collection, value);
+CREATE INDEX IF NOT EXISTS resource_keys_id ON resource_keys (collection, id);
+"""
+
+# Size of the keep-alive connection pool used for the API host when the
+# module does not ask for more concurrency.
+HTTP_POOL_SIZE = 10
+
+# Requests answered with 429 Too Many Requests are sent again up to
+# RATE_LIMIT_RETRIES times, waiting as long as the Retry-After header asks
+# or, without one, backing off exponentially up to RATE_LIMIT_BACKOFF_CAP
+# seconds. Idempotent requests failing with RETRY_STATUSES are retried by
+# the SDK's adapter along with the statuses it already retries.
+RATE_LIMIT_RETRIES = 6
+RATE_LIMIT_BACKOFF_CAP = 30
+RETRY_STATUSES = (502, 503, 504)
+
+_RESOURCE_INDEXES = weakref.WeakKeyDictionary()
+_RESOURCE_INDEXES_LOCK = threading.Lock()
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+class CatalogCache(object):
+    """
+    File-backed cache of static catalog listings with a TTL.
+
+    Every collection is stored in its own JSON file. Files are written to
+    a temporary file and renamed into place, so concurrent readers from
+    many forks only ever see a complete listing.
+    """
+
+    def __init__(self, cache_dir, ttl, namespace):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def _path(self, collection):
+        return os.path.join(self.cache_dir,
+                            'oneandone-%s-%s.json' % (self.namespace, collection))
+
+    def load(self, collection):
+        """
+        Returns the cached listing, or None if it is missing or expired.
+        """
+        try:
+            with open(self._path(collection)) as cache_file:
+                cached = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if not isinstance(cached, dict) or time.time() - cached.get('created', 0) > self.ttl:
+            return None
+        return cached.get('resources')
+
+    def store(self, collection, resources):
+        """
+        Atomically replaces the cached listing. Failures are ignored,
+        the cache being an optimization only.
+        """
+        try:
+            os.makedirs(self.cache_dir, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.oneandone-')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump({'created': time.time(), 'resources': resources}, tmp_file)
+            os.rename(tmp_path, self._path(collection))
+        except (IOError, OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class ResourceMirror(object):
+    """
+    Local SQLite copy of the 1&1 resource collections, shared by all
+    tasks and forks using the same token.
+
+    Resources are stored as JSON and indexed by all of their identifying
+    keys. A collection is listed in full the first time it is needed.
+    Afterwards, once the copy is older than max_age seconds, the audit log
+    since the last update is replayed: every resource it names is fetched
+    again, or dropped if it no longer exists. Updates run in an exclusive
+    transaction, so concurrent forks wait for one another instead of
+    repeating them. Runs that change resources fetch them again and make
+    the next run replay the log.
+
+    Resources read from the mirror can be up to max_age seconds old.
+    Decisions that depend on their state must be taken on a copy fetched
+    again by ID, see ResourceIndex.current.
+    """
+
+    def __init__(self, oneandone_conn, path, max_age):
+        self.oneandone_conn = oneandone_conn
+        self.path = path
+        self.max_age = max_age
+        self._db = None
+        self._refreshed = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            try:
+                os.makedirs(os.path.dirname(self.path), 0o700)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            self._db = sqlite3.connect(self.path,
+                                       timeout=MIRROR_LOCK_TIMEOUT,
+                                       isolation_level=None,
+                                       check_same_thread=False)
+            # Forks opening a new mirror together create the schema one
+            # at a time.
+            self._db.executescript('BEGIN IMMEDIATE;' + MIRROR_SCHEMA + 'COMMIT;')
+        return self._db
+
+    def _get_state(self, db, key):
+        row = db.execute('SELECT value FROM mirror_state WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            return row[0]
+
+    def _set_state(self, db, key, value):
+        db.execute('INSERT OR REPLACE INTO mirror_state (key, value) VALUES (?, ?)', (key, value))
+
+    def _store(self, db, collection, resource):
+        self._drop(db, collection, resource['id'])
+        db.execute('INSERT INTO resources (collection, id, data) VALUES (?, ?, ?)',
+                   (collection, resource['id'], json.dumps(resource)))
+        for key in RESOURCE_COLLECTIONS[collection][2]:
+            value = resource.get(key)
+            if value is not None:
+                db.execute('INSERT INTO resource_keys (collection, value, id) VALUES (?, ?, ?)',
+                           (collection, value, resource['id']))
+
+    def _drop(self, db, collection, resource_id=None):
+        if resource_id is None:
+            db.execute('DELETE FROM resources WHERE collection = ?', (collection,))
+            db.execute('DELETE FROM resource_keys WHERE collection = ?', (collection,))
+            db.execute('DELETE FROM mirror_state WHERE key = ?', ('loaded:' + collection,))
+        else:
+            db.execute('DELETE FROM resources WHERE collection = ? AND id = ?', (collection, resource_id))
+            db.execute('DELETE FROM resource_keys WHERE collection = ? AND id = ?', (collection, resource_id))
+
+    def _load(self, db, collection):
+        method, kwargs, _, _, _ = RESOURCE_COLLECTIONS[collection]
+        started = time.time()
+        self._drop(db, collection)
+        for resource in iterate_pages(getattr(self.oneandone_conn, method),
+                                      PAGE_SIZE, prefetch=True, **kwargs):
+            self._store(db, collection, resource)
+        self._set_state(db, 'loaded:' + collection, started)
+
+    def _changed_resources(self, since):
+        """
+        Returns the IDs of the resources named in the audit log since the
+        given time, by collection, or None if the log does not reach back
+        that far.
+        """
+        age = time.time() - since + LOG_CLOCK_SKEW
+        periods = [period for period, seconds in LOG_PERIODS if age < seconds]
+        if not periods:
+            return None
+
+        oldest = since - LOG_CLOCK_SKEW
+        changed = {}
+        for log in iterate_pages(self.oneandone_conn.list_logs,
+                                 LOG_PAGE_SIZE,
+                                 period=periods[0],
+                                 sort='-start_date'):
+            started = _parse_log_date(log.get('start_date'))
+            if started is not None and started < oldest:
+                break
+            collection = MIRROR_LOG_TYPES.get(log.get('type'))
+            if collection is not None and log.get('resource'):
+                changed.setdefault(collection, set()).add(log['resource']['id'])
+        return changed
+
+    def _replay(self, db, collection, resource_ids):
+        get_method = getattr(self.oneandone_conn, RESOURCE_COLLECTIONS[collection][3])
+        for resource_id in resource_ids:
+            try:
+                self._store(db, collection, get_method(resource_id))
+            except Exception as e:
+                if get_http_status(e) not in (400, 404):
+                    raise
+                self._drop(db, collection, resource_id)
+
+    def _refresh(self, db):
+        synced = self._get_state(db, 'synced')
+        started = time.time()
+        if (synced is not None and started - synced <= self.max_age and
+                self._get_state(db, 'expired') is None):
+            return
+
+        loaded = [row[0][len('loaded:'):] for row in
+                  db.execute("SELECT key FROM mirror_state WHERE key LIKE 'loaded:%'")]
+        changed = {}
+        if synced is not None and loaded:
+            changed = self._changed_resources(synced)
+
+        if changed is None:
+            for collection in loaded:
+                self._drop(db, collection)
+        else:
+            for collection, resource_ids in changed.items():
+                if collection not in loaded:
+                    continue
+                if len(resource_ids) > MIRROR_REPLAY_LIMIT:
+                    self._drop(db, collection)
+                else:
+                    self._replay(db, collection, resource_ids)
+        self._set_state(db, 'synced', started)
+        db.execute("DELETE FROM mirror_state WHERE key = 'expired'")
+
+    def update(self, collection, resource_ids):
+        """
+        Fetches the given resources of a collection again after this run
+        changed them, or drops the collection above MIRROR_REPLAY_LIMIT
+        resources. The next run replays the audit log whatever the age of
+        the mirror, for the other effects of the changes.
+        """
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                if self._get_state(db, 'loaded:' + collection) is not None:
+                    if len(resource_ids) > MIRROR_REPLAY_LIMIT:
+                        self._drop(db, collection)
+                    else:
+                        self._replay(db, collection, resource_ids)
+                self._set_state(db, 'expired', 1)
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+
+    def _query(self, collection, query, args):
+        """
+        Brings the mirror up to date once per run and the collection in
+        it, then runs the query on it.
+        """
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                if not self._refreshed:
+                    self._refresh(db)
+                if self._get_state(db, 'loaded:' + collection) is None:
+                    self._load(db, collection)
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            self._refreshed = True
+            return [json.loads(row[0]) for row in db.execute(query, args)]
+
+    def resources(self, collection):
+        """
+        Returns all the resources of a collection.
+        """
+        return self._query(collection,
+                           'SELECT data FROM resources WHERE collection = ?',
+                           (collection,))
+
+    def find(self, collection, identifier):
+        """
+        Returns the resource matching the identifier, or None.
+        """
+        resources = self._query(
+            collection,
+            'SELECT data FROM resources WHERE collection = ? AND id IN '
+            '(SELECT id FROM resource_keys WHERE collection = ? AND value = ?) LIMIT 1',
+            (collection, collection, identifier))
+        if resources:
+            return resources[0]
+
+
+class ResourceIndex(object):
+    """
+    Per-run cache of 1&1 resource collections.
+
+    A whole collection is listed once, page by page, when it is needed in
+    bulk, and indexed by all of its identifying keys. Single lookups on
+    collections that are not indexed yet use a GET by ID or a name search
+    instead, and their results are remembered too. Mutating calls must
+    invalidate the collections they change.
+
+    With a ResourceMirror, the collections it keeps are read from it until
+    they are invalidated, and identifiers it does not know are looked up
+    through the API. Resources read from the mirror may be stale: current()
+    fetches them again by ID, and invalidating a collection updates the
+    mirror copy of the resources found in it.
+    """
+
+    def __init__(self, oneandone_conn):
+        self.oneandone_conn = oneandone_conn
+        self.catalog_cache = None
+        self.mirror = None
+        self._mirrored = set(MIRROR_LOG_TYPES.values())
+        self._from_mirror = set()
+        self._indexes = {}
+        self._found = dict((collection, {}) for collection in RESOURCE_COLLECTIONS)
+        self._mirror_ids = dict((collection, set()) for collection in RESOURCE_COLLECTIONS)
+        self._found_ids = dict((collection, set()) for collection in RESOURCE_COLLECTIONS)
+        self._current = dict((collection, {}) for collection in RESOURCE_COLLECTIONS)
+        self._locks = dict((collection, threading.Lock())
+                           for collection in RESOURCE_COLLECTIONS)
+
+    def _uses_mirror(self, collection):
+        return self.mirror is not None and collection in self._mirrored
+
+    def _list(self, collection):
+        method, kwargs, _, _, paged = RESOURCE_COLLECTIONS[collection]
+        if self._uses_mirror(collection):
+            self._from_mirror.add(collection)
+            resources = self.mirror.resources(collection)
+            self._mirror_ids[collection].update(resource['id'] for resource in resources)
+            return resources
+
+        catalog_cache = None
+        if collection in CATALOG_COLLECTIONS:
+            catalog_cache = self.catalog_cache
+
+        if catalog_cache is not None:
+            resources = catalog_cache.load(collection)
+            if resources is not None:
+                return resources
+
+        list_method = getattr(self.oneandone_conn, method)
+        if paged:
+            return iterate_pages(list_method, PAGE_SIZE, prefetch=True, **kwargs)
+
+        resources = list_method(**kwargs)
+        if catalog_cache is not None:
+            catalog_cache.store(collection, resources)
+        return resources
+
+    def _load(self, collection):
+        keys = RESOURCE_COLLECTIONS[collection][2]
+        index = {}
+        for resource in self._list(collection):
+            for key in keys:
+                value = resource.get(key)
+                if value is not None:
+                    index.setdefault(value, resource)
+        return index
+
+    def _fetch(self, collection, identifier):
+        method, kwargs, keys, get_method, _ = RESOURCE_COLLECTIONS[collection]
+
+        if RESOURCE_ID_RE.match(str(identifier)):
+            try:
+                return getattr(self.oneandone_conn, get_method)(identifier)
+            except Exception as e:
+                if get_http_status(e) not in (400, 404):
+                    raise
+
+        kwargs = dict(kwargs, q=identifier)
+        for resource in iterate_pages(getattr(self.oneandone_conn, method),
+                                      SEARCH_PAGE_SIZE, **kwargs):
+            if identifier in [resource.get(key) for key in keys]:
+                return resource
+
+    def get(self, collection):
+        """
+        Returns the index of a collection, listing it if needed.
+        """
+        with self._locks[collection]:
+            index = self._indexes.get(collection)
+            if index is None:
+                index = self._indexes[collection] = self._load(collection)
+            return index
+
+    def is_indexed(self, collection):
+        return collection in self._indexes
+
+    def find(self, collection, identifier):
+        """
+        Returns the resource matching the identifier, or None.
+        """
+        if RESOURCE_COLLECTIONS[collection][3] is None:
+            return self.get(collection).get(identifier)
+
+        if self.is_indexed(collection):
+            resource = self.get(collection).get(identifier)
+            if resource is not None or collection not in self._from_mirror:
+                return self._remember(collection, resource)
+
+        with self._locks[collection]:
+            found = self._found[collection]
+            if identifier not in found:
+                resource = None
+                if self._uses_mirror(collection):
+                    resource = self.mirror.find(collection, identifier)
+                    if resource is not None:
+                        self._mirror_ids[collection].add(resource['id'])
+                if resource is None:
+                    resource = self._fetch(collection, identifier)
+                found[identifier] = resource
+            return self._remember(collection, found[identifier])
+
+    def _remember(self, collection, resource):
+        if resource is not None:
+            self._found_ids[collection].add(resource['id'])
+        return resource
+
+    def current(self, collection, resource):
+        """
+        Returns the resource as the API has it now. Resources read from
+        the mirror are fetched again by ID, once per run; the others were
+        fetched during this run and are returned as they are.
+        """
+        with self._locks[collection]:
+            if resource['id'] not in self._mirror_ids[collection]:
+                return resource
+            current = self._current[collection]
+            if resource['id'] not in current:
+                get_method = getattr(self.oneandone_conn, RESOURCE_COLLECTIONS[collection][3])
+                current[resource['id']] = get_method(resource['id'])
+            return current[resource['id']]
+
+    def invalidate(self, *collections):
+        """
+        Drops the given collections, or all of them if none are given,
+        so that the next lookup lists them again. The mirror copies of the
+        resources found in them during this run are fetched again.
+        """
+        for collection in collections or list(RESOURCE_COLLECTIONS):
+            with self._locks[collection]:
+                if self._uses_mirror(collection):
+                    changed = self._found_ids[collection].intersection(self._mirror_ids[collection])
+                    self.mirror.update(collection, sorted(changed))
+                self._indexes.pop(collection, None)
+                self._found[collection] = {}
+                self._found_ids[collection] = set()
+                self._mirror_ids[collection] = set()
+                self._current[collection] = {}
+                self._mirrored.discard(collection)
+                self._from_mirror.discard(collection)
+
+
+class _PageFetcher(threading.Thread):
+    """
+    Requests one page of a listing in the background.
+    """
+
+    def __init__(self, list_method, page, per_page, kwargs):
+        super(_PageFetcher, self).__init__()
+        self.daemon = True
+        self.list_method = list_method
+        self.page = page
+        self.per_page = per_page
+        self.kwargs = kwargs
+        self.resources = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.resources = self.list_method(page=self.page,
+                                              per_page=self.per_page,
+                                              **self.kwargs)
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.resources
+
+
+def iterate_pages(list_method, per_page, prefetch=False, **kwargs):
+    """
+    Yields the resources of a paginated listing, one page at a time.
+    Callers that stop iterating once they found what they were looking
+    for never request the remaining pages. With prefetch, the next page
+    is requested in the background while the current one is consumed.
+    """
+    page = 1
+    resources = list_method(page=page, per_page=per_page, **kwargs)
+    while True:
+        next_page = None
+        if prefetch and len(resources) >= per_page:
+            next_page = _PageFetcher(list_method, page + 1, per_page, kwargs)
+            next_page.start()
+
+        for resource in resources:
+            yield resource
+        if len(resources) < per_page:
+            return
+
+        page += 1
+        if next_page is not None:
+            resources = next_page.result()
+        else:
+            resources = list_method(page=page, per_page=per_page, **kwargs)
+
+
+def get_resource_index(oneandone_conn):
+    """
+    Returns the ResourceIndex bound to the given connection.
+    """
+    with _RESOURCE_INDEXES_LOCK:
+        resource_index = _RESOURCE_INDEXES.get(oneandone_conn)
+        if resource_index is None:
+            resource_index = ResourceIndex(oneandone_conn)
+            _RESOURCE_INDEXES[oneandone_conn] = resource_index
+        return resource_index
+
+
+def get_rate_limiter(module):
+    """
+    Returns the RateLimiter for the module's rate_limit parameter, or None
+    if requests are not limited. Unless rate_limit_file is set, the bucket
+    is kept in the temporary directory, namespaced by API URL and token.
+    """
+    rate_limit = module.params.get('rate_limit')
+    if not rate_limit or float(rate_limit) <= 0:
+        return None
+
+    path = module.params.get('rate_limit_file')
+    if not path:
+        namespace = hashlib.sha1(('%s|%s' % (module.params.get('api_url'),
+                                             module.params.get('auth_token'))).encode('utf-8')).hexdigest()
+        path = os.path.join(tempfile.gettempdir(), 'oneandone-rate-limit-%s' % namespace[:16])
+    return RateLimiter(rate_limit, os.path.expanduser(path))
+
+
+def configure_catalog_cache(module, oneandone_conn):
+    """
+    Enables the on-disk catalog cache for the given connection when the
+    catalog_cache_ttl parameter is set. Cached files are namespaced by API
+    URL and token, since appliance listings include private images.
+    """
+    ttl = module.params.get('catalog_cache_ttl')
+    if not ttl:
+        return
+
+    namespace = hashlib.sha1(('%s|%s' % (module.params.get('api_url'),
+                                         module.params.get('auth_token'))).encode('utf-8')).hexdigest()
+    get_resource_index(oneandone_conn).catalog_cache = CatalogCache(
+        os.path.expanduser(module.params.get('catalog_cache_dir')), ttl, namespace)
+
+
+def configure_mirror(module, oneandone_conn):
+    """
+    Makes the lookups of the given connection use the resource mirror
+    when the mirror_max_age parameter is set. Unless mirror_file is set,
+    the mirror is kept next to the catalog cache, namespaced by API URL
+    and token.
+    """
+    max_age = module.params.get('mirror_max_age')
+    if max_age is None or int(max_age) < 0 or not HAS_SQLITE3:
+        return
+
+    path = module.params.get('mirror_file')
+    if not path:
+        namespace = hashlib.sha1(('%s|%s' % (module.params.get('api_url'),
+                                             module.params.get('auth_token'))).encode('utf-8')).hexdigest()
+        path = os.path.join(module.params.get('catalog_cache_dir') or '~/.ansible/cache/oneandone',
+                            'oneandone-%s-mirror.sqlite' % namespace)
+    get_resource_index(oneandone_conn).mirror = ResourceMirror(
+        oneandone_conn, os.path.expanduser(path), int(max_age))
+
+
+class _SessionRequests(object):
+    """
+    Stands in for the requests module inside the SDK client, so that its
+    module level requests.get/post/put/delete calls go through one
+    keep-alive session instead of opening a new connection each time.
+    """
+
+    SESSION_METHODS = ('request', 'get', 'options', 'head',
+                       'post', 'put', 'patch', 'delete')
+
+    def __init__(self, requests_module, session):
+        self._requests = requests_module
+        self.session = session
+
+    def __getattr__(self, name):
+        if name in self.SESSION_METHODS:
+            return getattr(self.session, name)
+        return getattr(self._requests, name)
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the requests per second of all processes that
+    share its state file.
+
+    The bucket, and the time until which the API asked clients to back
+    off, are kept in a small JSON file updated under an exclusive lock, so
+    all forks of a play draw from one budget. Where fcntl is unavailable
+    the bucket is only shared by the threads of this process.
+    """
+
+    def __init__(self, rate, path):
+        self.rate = float(rate)
+        self.burst = max(1.0, self.rate)
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def _locked(self, update):
+        with self._lock:
+            if fcntl is None:
+                return update(self._state)
+
+            with open(self.path, 'a+') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    result = update(state)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _take(self, state):
+        now = time.time()
+        tokens = min(self.burst, state.get('tokens', self.burst) +
+                     max(0, now - state.get('updated', now)) * self.rate)
+        state['updated'] = now
+        state['tokens'] = tokens
+
+        blocked = state.get('blocked_until', 0) - now
+        if blocked > 0:
+            return blocked
+        if tokens >= 1:
+            state['tokens'] = tokens - 1
+            return 0
+        return (1 - tokens) / self.rate
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+        """
+        while True:
+            delay = self._locked(self._take)
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def block(self, seconds):
+        """
+        Holds the requests of every process sharing the bucket for the
+        given number of seconds.
+        """
+        def _block(state):
+            state['blocked_until'] = max(state.get('blocked_until', 0), time.time() + seconds)
+        self._locked(_block)
+
+
+def get_retry_after(response):
+    """
+    Returns the number of seconds a Retry-After header asks to wait, or
+    None if the response has no valid one.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, email.utils.mktime_tz(date) - time.time())
+
+
+def _throttle_session(session):
+    """
+    Makes the session wait for its rate_limiter, if one is set, before
+    every request, and send requests rejected with 429 again after the
+    delay the API asks for. The delay is shared through the rate limiter
+    so that the other forks hold their requests too.
+    """
+    send = session.send
+
+    def throttled_send(request, **kwargs):
+        delay = 1
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            rate_limiter = session.rate_limiter
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+
+            response = send(request, **kwargs)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                return response
+
+            retry_after = get_retry_after(response)
+            if retry_after is None:
+                retry_after = random.uniform(delay / 2.0, delay)
+                delay = min(delay * 2, RATE_LIMIT_BACKOFF_CAP)
+            response.close()
+
+            if rate_limiter is not None:
+                rate_limiter.block(retry_after)
+            else:
+                time.sleep(retry_after)
+
+    session.rate_limiter = None
+    session.send = throttled_send
+
+
+def install_http_session(client_module, pool_size=HTTP_POOL_SIZE):
+    """
+    Routes the HTTP calls of the SDK client module through a shared
+    requests session with a connection pool of the given size.
+
+    The SDK builds a new session, with its own retrying adapter, for
+    almost every call through requests_retry_session(). That factory is
+    replaced by one returning the shared session, which is set up by the
+    original factory so that the SDK's retry policy is kept, extended to
+    RETRY_STATUSES, and throttled as described in _throttle_session. The
+    few calls made through the requests module directly are proxied to
+    the same session. Returns the session, or None if the client cannot
+    be patched.
+    """
+    if not HAS_REQUESTS:
+        return None
+
+    with _HTTP_SESSION_LOCK:
+        sdk_requests = getattr(client_module, 'requests', None)
+        if sdk_requests is None:
+            return None
+        if isinstance(sdk_requests, _SessionRequests):
+            return sdk_requests.session
+
+        session = requests.Session()
+        retry_session = getattr(client_module, 'requests_retry_session', None)
+        if retry_session is not None:
+            retry_session(session=session)
+            for adapter in set(session.adapters.values()):
+                adapter.init_poolmanager(pool_size, pool_size)
+                retries = adapter.max_retries
+                adapter.max_retries = retries.new(
+                    status_forcelist=set(retries.status_forcelist or ()) | set(RETRY_STATUSES))
+        else:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                    pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        _throttle_session(session)
+
+        def shared_retry_session(*args, **kwargs):
+            return session
+
+        client_module.requests_retry_session = shared_retry_session
+        client_module.requests = _SessionRequests(sdk_requests, session)
+        return session
+
+
+class PerfRecorder(object):
+    """
+    Collects call counts, latencies, transferred bytes and time spent
+    sleeping in wait loops during one module run.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.calls = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.sleep_time = 0.0
+        self._lock = threading.Lock()
+
+    def record_call(self, name, elapsed, failed=False):
+        with self._lock:
+            call = self.calls.setdefault(name, {'count': 0, 'errors': 0,
+                                                'time': 0.0, 'max_time': 0.0})
+            call['count'] += 1
+            call['time'] += elapsed
+            call['max_time'] = max(call['max_time'], elapsed)
+            if failed:
+                call['errors'] += 1
+
+    def record_response(self, response, *args, **kwargs):
+        """
+        requests response hook counting the bytes of each exchange.
+        """
+        body = response.request.body or ''
+        with self._lock:
+            self.bytes_sent += len(body)
+            self.bytes_received += len(response.content or '')
+
+    def record_sleep(self, seconds):
+        with self._lock:
+            self.sleep_time += seconds
+
+    def summary(self):
+        with self._lock:
+            calls = dict((name, dict(call, time=round(call['time'], 3),
+                                     max_time=round(call['max_time'], 3)))
+                         for name, call in self.calls.items())
+            return {
+                'wall_time': round(time.time() - self.started, 3),
+                'api_calls': sum(call['count'] for call in calls.values()),
+                'api_time': round(sum(call['time'] for call in calls.values()), 3),
+                'sleep_time': round(self.sleep_time, 3),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'calls': calls,
+            }
+
+
+class InstrumentedConnection(object):
+    """
+    Wraps a OneAndOneService and times every method called through it.
+    """
+
+    def __init__(self, oneandone_conn, perf_recorder):
+        self.oneandone_conn = oneandone_conn
+        self.perf_recorder = perf_recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self.oneandone_conn, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed_call(*args, **kwargs):
+            started = time.time()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception:
+                self.perf_recorder.record_call(name, time.time() - started, failed=True)
+                raise
+            self.perf_recorder.record_call(name, time.time() - started)
+            return result
+
+        return timed_call
+
+
+def get_oneandone_connection(module):
+    """
+    Builds the authenticated OneAndOneService for the module's auth_token
+    and api_url parameters. All API calls of the run share one pool of
+    keep-alive connections, sized for the module's max_concurrency.
+    With the perf parameter set, the connection is instrumented. With the
+    rate_limit parameter set, requests are throttled, and with the
+    mirror_max_age parameter set, lookups use the resource mirror.
+    """
+    pool_size = max(HTTP_POOL_SIZE, module.params.get('max_concurrency') or 0)
+    session = install_http_session(oneandone.client, pool_size)
+    if session is not None:
+        session.rate_limiter = get_rate_limiter(module)
+
+    if not module.params.get('api_url'):
+        oneandone_conn = oneandone.client.OneAndOneService(
+            api_token=module.params.get('auth_token'))
+    else:
+        oneandone_conn = oneandone.client.OneAndOneService(
+            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+
+    if module.params.get('perf'):
+        perf_recorder = PerfRecorder()
+        if session is not None:
+            session.hooks['response'].append(perf_recorder.record_response)
+        oneandone_conn = InstrumentedConnection(oneandone_conn, perf_recorder)
+
+    configure_catalog_cache(module, oneandone_conn)
+    configure_mirror(module, oneandone_conn)
+
+    return oneandone_conn
+
+
+def report_perf(module, oneandone_conn):
+    """
+    Returns the perf result of an instrumented connection, keyed for
+    exit_json, and appends it to the perf_log file if one is set.
+    Returns an empty dictionary when the run was not instrumented.
+    """
+    perf_recorder = getattr(oneandone_conn, 'perf_recorder', None)
+    if perf_recorder is None:
+        return {}
+
+    perf = perf_recorder.summary()
+    perf_log = module.params.get('perf_log')
+    if perf_log:
+        entry = dict(perf, module=getattr(module, '_name', None),
+                     state=module.params.get('state'),
+                     timestamp=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+        try:
+            with open(os.path.expanduser(perf_log), 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+        except (IOError, OSError):
+            pass
+
+    return {'perf': perf}
+
+
+def wait_sleep(oneandone_conn, seconds):
+    """
+    Sleeps between status checks, accounting the time to the perf
+    recorder of an instrumented connection.
+    """
+    time.sleep(seconds)
+    perf_recorder = getattr(oneandone_conn, 'perf_recorder', None)
+    if perf_recorder is not None:
+        perf_recorder.record_sleep(seconds)
+
+
+def find_resource(oneandone_conn, collection, identifier):
+    """
+    Validates that a resource exists whether by ID or name.
+    Returns the resource if one was found, else None.
+    """
+    return get_resource_index(oneandone_conn).find(collection, identifier)
+
+
+def current_resource(oneandone_conn, collection, resource):
+    """
+    Returns a resource found with find_resource as the API has it now,
+    fetching it again by ID if it was read from the resource mirror. Use
+    it before deciding what to change from the state of the resource.
+    """
+    return get_resource_index(oneandone_conn).current(collection, resource)
+
+
+def find_resources(oneandone_conn, collection, identifiers):
+    """
+    Looks up many resources at once. Above BULK_LOOKUP_THRESHOLD
+    identifiers the whole collection is indexed with a single listing.
+    Returns the resources, or None for the missing ones, in the order
+    of the identifiers.
+    """
+    resource_index = get_resource_index(oneandone_conn)
+    if len(identifiers) > BULK_LOOKUP_THRESHOLD:
+        resource_index.get(collection)
+    return [resource_index.find(collection, identifier) for identifier in identifiers]
+
+
+def resolve_server_ids(module, oneandone_conn, servers):
+    """
+    Resolves server names or IDs from a single lookup of the servers
+    collection. Fails the module on the first unknown server. Returns the
+    distinct server IDs in the given order.
+    """
+    server_ids = []
+    for identifier, server in zip(servers, find_resources(oneandone_conn, 'servers', servers)):
+        if server is None:
+            module.fail_json(msg='server %s not found.' % identifier)
+        if server['id'] not in server_ids:
+            server_ids.append(server['id'])
+    return server_ids
+
+
+def invalidate_resources(oneandone_conn, *collections):
+    """
+    Forgets the cached listings of the given collections.
+    """
+    get_resource_index(oneandone_conn).invalidate(*collections)
+
+
+def run_concurrently(function, items, max_concurrency):
+    """
+    Calls function on every item with up to max_concurrency calls in
+    flight, and returns the results in the order of the items. The first
+    exception raised by a call is raised again once the calls are done,
+    so function must raise rather than call fail_json.
+    """
+    items = list(items)
+    if max_concurrency <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    pool = ThreadPool(min(max_concurrency, len(items)))
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def backoff_delays(wait_interval):
+    """
+    Yields exponentially growing, jittered delays capped relative to
+    wait_interval.
+    """
+    cap = max(wait_interval * WAIT_BACKOFF_CAP_FACTOR, WAIT_BACKOFF_BASE)
+    delay = WAIT_BACKOFF_BASE
+    while True:
+        yield random.uniform(delay / 2.0, delay)
+        delay = min(delay * 2, cap)
+
+
+def get_resource_state(resource_type, resource):
+    """
+    Returns the upper-cased state of a resource of the given type.
+    """
+    state = resource
+    for key in RESOURCE_STATES[resource_type][1]:
+        state = state[key]
+    return state.upper()
+
+
+def _list_method(oneandone_conn, get_method):
+    """
+    Returns the paged listing method of the collection fetched by
+    get_method and its arguments, or (None, None) if there is none.
+    """
+    for method, kwargs, _, collection_get_method, paged in RESOURCE_COLLECTIONS.values():
+        if collection_get_method == get_method and paged:
+            return (getattr(oneandone_conn, method), kwargs)
+    return (None, None)
+
+
+class CreationWatcher(object):
+    """
+    Waits for a batch of new resources, of one or several types, to
+    settle.
+
+    Every pass refreshes the pending resources type by type. When more
+    than BULK_LOOKUP_THRESHOLD resources of a listable type are pending,
+    one listing of the collection replaces their individual GETs, and
+    only the resources it reports as ready are fetched individually.
+    Other resources are fetched with up to max_concurrency GETs in flight.
+    Resources that fail or disappear are moved to failed with the reason.
+    """
+
+    def __init__(self, oneandone_conn, max_concurrency=1):
+        self.oneandone_conn = oneandone_conn
+        self.max_concurrency = max_concurrency
+        self.pending = {}
+        self.resources = {}
+        self.failed = {}
+
+    def watch(self, resource_type, resource_id):
+        self.pending[resource_id] = resource_type
+
+    def _list_method(self, resource_type):
+        return _list_method(self.oneandone_conn, RESOURCE_STATES[resource_type][0])
+
+    def _is_ready(self, resource_type, resource_id, resource):
+        _, _, ready, pending, name = RESOURCE_STATES[resource_type]
+        if resource is None:
+            self._fail(resource_id, '%s %s not found' % (name.capitalize(), resource_id))
+            return False
+
+        state = get_resource_state(resource_type, resource)
+        if state in ready:
+            return True
+        elif state == 'FAILED':
+            self._fail(resource_id, '%s creation failed for %s' % (name.capitalize(), resource_id))
+        elif state not in pending:
+            self._fail(resource_id, 'Unknown %s state %s' % (name, state))
+        return False
+
+    def _fail(self, resource_id, message):
+        self.failed[resource_id] = message
+        del self.pending[resource_id]
+
+    def _fetch(self, resource_id):
+        get_method = RESOURCE_STATES[self.pending[resource_id]][0]
+        try:
+            return (resource_id, getattr(self.oneandone_conn, get_method)(resource_id))
+        except Exception as e:
+            if get_http_status(e) != 404:
+                raise
+            return (resource_id, None)
+
+    def poll(self):
+        """
+        Refreshes every pending resource once.
+        """
+        to_fetch = []
+        by_type = {}
+        for resource_id, resource_type in self.pending.items():
+            by_type.setdefault(resource_type, []).append(resource_id)
+
+        for resource_type, resource_ids in by_type.items():
+            list_method, kwargs = self._list_method(resource_type)
+            if list_method is None or len(resource_ids) <= BULK_LOOKUP_THRESHOLD:
+                to_fetch.extend(resource_ids)
+                continue
+
+            unlisted = set(resource_ids)
+            for resource in iterate_pages(list_method, PAGE_SIZE, prefetch=True, **kwargs):
+                if resource['id'] in unlisted:
+                    unlisted.discard(resource['id'])
+                    if self._is_ready(resource_type, resource['id'], resource):
+                        to_fetch.append(resource['id'])
+            to_fetch.extend(unlisted)
+
+        for resource_id, resource in run_concurrently(self._fetch, to_fetch, self.max_concurrency):
+            if self._is_ready(self.pending[resource_id], resource_id, resource):
+                self.resources[resource_id] = resource
+                del self.pending[resource_id]
+
+    def wait(self, wait_timeout, wait_interval):
+        """
+        Blocks until every watched resource reaches one of the ready states
+        of its type. The resources are checked immediately, then polled
+        with a jittered exponential backoff.
+        Returns the refreshed resources by ID.
+        """
+        delays = backoff_delays(wait_interval)
+
+        wait_timeout = time.time() + wait_timeout
+        while True:
+            self.poll()
+            if self.failed:
+                raise Exception(self.failed[sorted(self.failed)[0]])
+            if not self.pending:
+                return self.resources
+
+            remaining = wait_timeout - time.time()
+            if remaining <= 0:
+                break
+            wait_sleep(self.oneandone_conn, min(next(delays), remaining))
+
+        names = sorted(set(RESOURCE_STATES[resource_type][4]
+                           for resource_type in self.pending.values()))
+        raise Exception(
+            'Timed out waiting for %s completion for %s' % (
+                ', '.join(names), ', '.join(sorted(self.pending))))
+
+
+def wait_for_resource_creation_completion(oneandone_conn, resource_type,
+                                          resource_id, wait_timeout,
+                                          wait_interval):
+    """
+    Waits for a resource to reach one of the ready states of its type.
+    Returns the refreshed resource.
+    """
+    creation_watcher = CreationWatcher(oneandone_conn)
+    creation_watcher.watch(resource_type, resource_id)
+    return creation_watcher.wait(wait_timeout, wait_interval)[resource_id]
+
+
+def record_job(module, resource_type, resource):
+    """
+    Appends the handle of a resource created without waiting to the
+    job_file of the module, if one is set, for oneandone_job_status to
+    check later.
+    """
+    job_file = module.params.get('job_file')
+    if not job_file:
+        return
+
+    job = {'type': resource_type,
+           'id': resource['id'],
+           'name': resource.get('name'),
+           'submitted': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+    with open(os.path.expanduser(job_file), 'a') as f:
+        f.write(json.dumps(job, sort_keys=True) + '\n')
+
+
+def read_jobs(job_file):
+    """
+    Returns the job handles recorded in a job file, without duplicates.
+    A missing file has no jobs.
+    """
+    jobs = []
+    seen = set()
+    try:
+        with open(os.path.expanduser(job_file)) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                job = json.loads(line)
+                if job['id'] not in seen:
+                    seen.add(job['id'])
+                    jobs.append(job)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    return jobs
+
+
+def write_jobs(job_file, jobs):
+    """
+    Atomically replaces the job handles of a job file.
+    """
+    job_file = os.path.expanduser(job_file)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(job_file)),
+                                    prefix='.oneandone-')
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            for job in jobs:
+                tmp_file.write(json.dumps(job, sort_keys=True) + '\n')
+        os.rename(tmp_path, job_file)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def get_http_status(error):
+    """
+    Returns the HTTP status code carried by an SDK error, if any.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        match = re.search(r'Error Code: (\d+)', str(error))
+        if match:
+            status = int(match.group(1))
+    return status
+
+
+def _parse_log_date(value):
+    try:
+        return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+class DeletionWatcher(object):
+    """
+    Waits for the deletion of a batch of resources of one type.
+
+    Every pass first scans the DELETE audit log page by page, matching all
+    pending resource IDs at once, and stops paging as soon as entries are
+    older than the deletion requests. Resources still pending are then
+    probed, a 404 meaning the deletion has completed. When more than
+    BULK_LOOKUP_THRESHOLD resources are pending, one listing of the
+    collection replaces the probes, the resources missing from it being
+    deleted. Otherwise up to max_concurrency probes are in flight.
+    """
+
+    def __init__(self, oneandone_conn, log_type, get_method, resource_name,
+                 max_concurrency=1):
+        self.oneandone_conn = oneandone_conn
+        self.log_type = log_type
+        self.get_method = get_method
+        self.resource_name = resource_name
+        self.max_concurrency = max_concurrency
+        self.requested_at = time.time()
+        self.pending = set()
+
+    def watch(self, resource_id):
+        self.pending.add(resource_id)
+
+    def _scan_logs(self):
+        if not self.pending:
+            return
+
+        oldest = self.requested_at - LOG_CLOCK_SKEW
+        logs = iterate_pages(self.oneandone_conn.list_logs,
+                             LOG_PAGE_SIZE,
+                             q='DELETE',
+                             period='LAST_HOUR',
+                             sort='-start_date')
+        for log in logs:
+            started = _parse_log_date(log.get('start_date'))
+            if started is not None and started < oldest:
+                return
+            if (log['resource']['id'] in self.pending and
+                    log['action'] == 'DELETE' and
+                    log['type'] == self.log_type and
+                    log['status']['state'] == 'OK'):
+                self.pending.discard(log['resource']['id'])
+                if not self.pending:
+                    return
+
+    def _exists(self, resource_id):
+        try:
+            getattr(self.oneandone_conn, self.get_method)(resource_id)
+            return True
+        except Exception as e:
+            if get_http_status(e) != 404:
+                raise
+            return False
+
+    def _probe(self):
+        list_method, kwargs = _list_method(self.oneandone_conn, self.get_method)
+        if list_method is not None and len(self.pending) > BULK_LOOKUP_THRESHOLD:
+            listed = set(resource['id'] for resource in
+                         iterate_pages(list_method, PAGE_SIZE, prefetch=True, **kwargs))
+            self.pending &= listed
+            return
+
+        resource_ids = list(self.pending)
+        for resource_id, exists in zip(resource_ids,
+                                       run_concurrently(self._exists, resource_ids,
+                                                        self.max_concurrency)):
+            if not exists:
+                self.pending.discard(resource_id)
+
+    def wait(self, wait_timeout, wait_interval=5):
+        """
+        Blocks until every watched resource is deleted. The resources are
+        first checked after a jittered backoff delay, which then grows
+        exponentially.
+        """
+        delays = backoff_delays(wait_interval)
+
+        wait_timeout = time.time() + wait_timeout
+        while wait_timeout > time.time():
+            wait_sleep(self.oneandone_conn,
+                       min(next(delays), max(wait_timeout - time.time(), 0)))
+
+            self._scan_logs()
+            self._probe()
+            if not self.pending:
+                return
+
+        raise Exception(
+            'Timed out waiting for %s deletion for %s' % (
+                self.resource_name, ', '.join(sorted(self.pending))))
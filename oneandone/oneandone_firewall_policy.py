@@ -58,6 +58,10 @@ options:
       - A list of rules that will be set for the firewall policy.
         Each rule must contain protocol parameter, in addition to three optional parameters
         (port_from, port_to, and source)
+      - With update state, the complete list of rules the firewall policy should have.
+        Rules are compared by protocol, port_from, port_to and source; missing rules are
+        added and rules that are not listed are removed. Cannot be combined with add_rules
+        or remove_rules.
   port_from:
     description:
       - First port in range. Required for UDP and TCP protocols, otherwise it will be set up automatically.
@@ -77,6 +81,13 @@ options:
       - IPs from which access is available. Setting 0.0.0.0 all IPs are allowed.
     default: 0.0.0.0
     required: false
+  server_ips:
+    description:
+      - The complete list of servers (id, name, or IP address) the firewall policy should be
+        assigned to. Missing servers are assigned and servers that are not listed are unassigned.
+        Used in combination with update state. Cannot be combined with add_server_ips or
+        remove_server_ips.
+    required: false
   add_server_ips:
     description:
       - A list of server identifiers (id or name) to be assigned to a firewall policy.
@@ -100,6 +111,48 @@ options:
       - Firewall policy description.
     maxLength: 256
     required: false
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -112,7 +165,8 @@ options:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -196,6 +250,28 @@ EXAMPLES = '''
     wait_timeout: 500
     state: update
 
+# Set the exact rules and servers of a firewall policy. Only the differences
+# are applied, and the task reports no change when there are none.
+
+- oneandone_firewall_policy:
+    auth_token: oneandone_private_api_key
+    firewall_policy: ansible-firewall-policy-updated
+    rules:
+     -
+       protocol: TCP
+       port_from: 80
+       port_to: 80
+       source: 0.0.0.0
+     -
+       protocol: TCP
+       port_from: 443
+       port_to: 443
+       source: 0.0.0.0
+    server_ips:
+     - server_identifier (id or name)
+     - server_identifier #2 (id or name)
+    state: update
+
 # Remove rules from a firewall policy.
 
 - oneandone_firewall_policy:
@@ -211,9 +287,17 @@ EXAMPLES = '''
 
 '''
 
-import time
 import os
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    current_resource,
+    find_resource,
+    find_resources,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    wait_for_resource_creation_completion)
 
 HAS_ONEANDONE_SDK = True
 
@@ -223,50 +307,12 @@ except ImportError:
     HAS_ONEANDONE_SDK = False
 
 
-def _wait_for_firewall_policy_creation_completion(oneandone_conn, firewall_policy, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the firewall policy info
-        firewall_policy = oneandone_conn.get_firewall(firewall_policy['id'])
-
-        if firewall_policy['state'].lower() == 'active':
-            return
-        elif firewall_policy['state'].lower() == 'failed':
-            raise Exception('Firewall policy creation ' +
-                            ' failed for %s' % firewall_policy['id'])
-        elif firewall_policy['state'].lower() in ('enabled',
-                                                  'deploying',
-                                                  'configuring'):
-            continue
-        else:
-            raise Exception(
-                'Unknown firewall policy state %s' % firewall_policy['state'])
-
-    raise Exception(
-        'Timed out waiting for firewall policy completion for %s' % firewall_policy['id'])
-
-
 def _find_firewall_policy(oneandone_conn, firewall_policy):
     """
     Validates that the firewall policy exists whether by ID or name.
     Returns the firewall policy if one was found.
     """
-    for _firewall_policy in oneandone_conn.list_firewall_policies(per_page=1000):
-        if firewall_policy in (_firewall_policy['id'],
-                               _firewall_policy['name']):
-            return _firewall_policy
-
-
-def _find_machine(oneandone_conn, instance):
-    """
-    Validates that the machine exists whether by ID or name.
-    Returns the machine if one was found.
-    """
-    for _machine in oneandone_conn.list_servers(per_page=1000):
-        if instance in (_machine['id'], _machine['name']):
-            return _machine
+    return find_resource(oneandone_conn, 'firewall_policies', firewall_policy)
 
 
 def _add_server_ips(module, oneandone_conn, firewall_id, server_ids):
@@ -276,8 +322,7 @@ def _add_server_ips(module, oneandone_conn, firewall_id, server_ids):
     try:
         attach_servers = []
 
-        for _server_id in server_ids:
-            server = _find_machine(oneandone_conn, _server_id)
+        for server in find_resources(oneandone_conn, 'servers', server_ids):
             attach_server = oneandone.client.AttachServer(
                 server_id=server['id'],
                 server_ip_id=next(iter(server['ips'] or []), None)['id']
@@ -313,9 +358,9 @@ def _add_firewall_rules(module, oneandone_conn, firewall_id, rules):
         for rule in rules:
             firewall_rule = oneandone.client.FirewallPolicyRule(
                 protocol=rule['protocol'],
-                port_from=rule['port_from'],
-                port_to=rule['port_to'],
-                source=rule['source'])
+                port_from=rule.get('port_from'),
+                port_to=rule.get('port_to'),
+                source=rule.get('source', '0.0.0.0'))
             firewall_rules.append(firewall_rule)
 
         firewall_policy = oneandone_conn.add_firewall_policy_rule(
@@ -341,11 +386,104 @@ def _remove_firewall_rule(module, oneandone_conn, firewall_id, rule_id):
         module.fail_json(msg=str(e))
 
 
+def _rule_key(rule):
+    """
+    Returns the identity of a firewall rule, used to compare desired
+    rules with the rules of a firewall policy.
+    """
+    port_from = rule.get('port_from')
+    port_to = rule.get('port_to')
+    return (
+        str(rule.get('protocol')).upper(),
+        int(port_from) if port_from is not None else None,
+        int(port_to) if port_to is not None else None,
+        rule.get('source') or '0.0.0.0')
+
+
+def _reconcile_rules(module, oneandone_conn, firewall_policy, rules):
+    """
+    Makes the firewall policy rules match the desired rules, adding the
+    missing ones and removing the ones that are not desired.
+    Returns whether anything changed and the updated firewall policy.
+    """
+    current_rules = firewall_policy['rules'] or []
+    current_keys = set(_rule_key(rule) for rule in current_rules)
+    desired_keys = set(_rule_key(rule) for rule in rules)
+
+    add_rules = []
+    for rule in rules:
+        key = _rule_key(rule)
+        if key not in current_keys:
+            add_rules.append(rule)
+            current_keys.add(key)
+    remove_rules = [rule['id'] for rule in current_rules
+                    if _rule_key(rule) not in desired_keys]
+
+    if add_rules:
+        firewall_policy = _add_firewall_rules(module,
+                                              oneandone_conn,
+                                              firewall_policy['id'],
+                                              add_rules)
+    for rule_id in remove_rules:
+        firewall_policy = _remove_firewall_rule(module,
+                                                oneandone_conn,
+                                                firewall_policy['id'],
+                                                rule_id)
+
+    return (bool(add_rules or remove_rules), firewall_policy)
+
+
+def _reconcile_server_ips(module, oneandone_conn, firewall_policy, server_ids):
+    """
+    Makes the servers assigned to the firewall policy match the desired
+    servers. Identifiers that match an assigned server by id, name or IP
+    are settled without looking the server up.
+    Returns whether anything changed and the updated firewall policy.
+    """
+    current_ips = firewall_policy['server_ips'] or []
+    current_ip_ids = set(server_ip['id'] for server_ip in current_ips)
+
+    keep_ip_ids = set()
+    unresolved = []
+    for server_id in server_ids:
+        # A server may have several of its IPs assigned; keep all of them.
+        matched = [server_ip['id'] for server_ip in current_ips
+                   if server_id in (server_ip['id'], server_ip.get('ip'),
+                                    server_ip.get('server_id'), server_ip.get('server_name'))]
+        if matched:
+            keep_ip_ids.update(matched)
+        else:
+            unresolved.append(server_id)
+
+    add_server_ids = []
+    for server_id, server in zip(unresolved, find_resources(oneandone_conn, 'servers', unresolved)):
+        if server is None:
+            module.fail_json(msg='server %s not found.' % server_id)
+        assigned = current_ip_ids.intersection(ip['id'] for ip in server['ips'] or [])
+        if assigned:
+            keep_ip_ids.update(assigned)
+        else:
+            add_server_ids.append(server_id)
+    remove_ip_ids = [server_ip['id'] for server_ip in current_ips
+                     if server_ip['id'] not in keep_ip_ids]
+
+    if add_server_ids:
+        firewall_policy = _add_server_ips(module, oneandone_conn, firewall_policy['id'], add_server_ids)
+    for server_ip_id in remove_ip_ids:
+        firewall_policy = _remove_firewall_server(module,
+                                                  oneandone_conn,
+                                                  firewall_policy['id'],
+                                                  server_ip_id)
+
+    return (bool(add_server_ids or remove_ip_ids), firewall_policy)
+
+
 def update_firewall_policy(module, oneandone_conn):
     """
     Updates a firewall policy based on input arguments.
     Firewall rules and server ips can be added/removed to/from
-    firewall policy. Firewall policy name and description can be
+    firewall policy, or set to a desired list with rules and
+    server_ips. Firewall policy name and description can be
     updated as well.
 
     module : AnsibleModule object
@@ -359,10 +497,15 @@ def update_firewall_policy(module, oneandone_conn):
         remove_server_ips = module.params.get('remove_server_ips')
         add_rules = module.params.get('add_rules')
         remove_rules = module.params.get('remove_rules')
+        rules = module.params.get('rules')
+        server_ips = module.params.get('server_ips')
 
         changed = False
 
         firewall_policy = _find_firewall_policy(oneandone_conn, firewall_policy_id)
+        if firewall_policy is None:
+            module.fail_json(msg='firewall policy %s not found.' % firewall_policy_id)
+        firewall_policy = current_resource(oneandone_conn, 'firewall_policies', firewall_policy)
 
         if name or description:
             firewall_policy = oneandone_conn.modify_firewall(
@@ -371,6 +514,13 @@ def update_firewall_policy(module, oneandone_conn):
                 description=description)
             changed = True
 
+        if server_ips is not None:
+            (servers_changed, firewall_policy) = _reconcile_server_ips(module,
+                                                                       oneandone_conn,
+                                                                       firewall_policy,
+                                                                       server_ips)
+            changed = changed or servers_changed
+
         if add_server_ips:
             firewall_policy = _add_server_ips(module, oneandone_conn, firewall_policy['id'], add_server_ips)
             changed = True
@@ -381,9 +531,15 @@ def update_firewall_policy(module, oneandone_conn):
                                         oneandone_conn,
                                         firewall_policy['id'],
                                         server_ip_id)
-                firewall_policy = _find_firewall_policy(oneandone_conn, firewall_policy['id'])
             changed = True
 
+        if rules is not None:
+            (rules_changed, firewall_policy) = _reconcile_rules(module,
+                                                                oneandone_conn,
+                                                                firewall_policy,
+                                                                rules)
+            changed = changed or rules_changed
+
         if add_rules:
             firewall_policy = _add_firewall_rules(module,
                                                   oneandone_conn,
@@ -397,9 +553,14 @@ def update_firewall_policy(module, oneandone_conn):
                                       oneandone_conn,
                                       firewall_policy['id'],
                                       rule_id)
-                firewall_policy = _find_firewall_policy(oneandone_conn, firewall_policy['id'])
             changed = True
 
+        if changed:
+            invalidate_resources(oneandone_conn, 'firewall_policies')
+        if remove_server_ips or remove_rules:
+            # Removals are issued back to back; fetch the final state once.
+            firewall_policy = oneandone_conn.get_firewall(firewall_policy['id'])
+
         return (changed, firewall_policy)
     except Exception as e:
         module.fail_json(msg=str(e))
@@ -422,12 +583,12 @@ def create_firewall_policy(module, oneandone_conn):
 
         firewall_rules = []
 
-        for rule in rules:
+        for rule in rules or []:
             firewall_rule = oneandone.client.FirewallPolicyRule(
                 protocol=rule['protocol'],
-                port_from=rule['port_from'],
-                port_to=rule['port_to'],
-                source=rule['source'])
+                port_from=rule.get('port_from'),
+                port_to=rule.get('port_to'),
+                source=rule.get('source', '0.0.0.0'))
             firewall_rules.append(firewall_rule)
 
         firewall_policy_obj = oneandone.client.FirewallPolicy(
@@ -439,10 +600,17 @@ def create_firewall_policy(module, oneandone_conn):
             firewall_policy=firewall_policy_obj,
             firewall_policy_rules=firewall_rules
         )
+        invalidate_resources(oneandone_conn, 'firewall_policies')
 
         if wait:
-            _wait_for_firewall_policy_creation_completion(
-                oneandone_conn, firewall_policy, wait_timeout, wait_interval)
+            firewall_policy = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'firewall_policy',
+                firewall_policy['id'],
+                wait_timeout,
+                wait_interval)
+        else:
+            record_job(module, 'firewall_policy', firewall_policy)
 
         changed = True if firewall_policy else False
 
@@ -462,6 +630,7 @@ def remove_firewall_policy(module, oneandone_conn):
         fp_id = module.params.get('name')
         firewall_policy = _find_firewall_policy(oneandone_conn, fp_id)
         firewall_policy = oneandone_conn.delete_firewall(firewall_policy['id'])
+        invalidate_resources(oneandone_conn, 'firewall_policies')
 
         changed = True if firewall_policy else False
 
@@ -485,7 +654,8 @@ def main():
             name=dict(type='str'),
             firewall_policy=dict(type='str'),
             description=dict(type='str'),
-            rules=dict(type='list', default=[]),
+            rules=dict(type='list'),
+            server_ips=dict(type='list'),
             add_server_ips=dict(type='list', default=[]),
             remove_server_ips=dict(type='list', default=[]),
             add_rules=dict(type='list', default=[]),
@@ -493,6 +663,21 @@ def main():
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -504,12 +689,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -525,6 +705,11 @@ def main():
         if not module.params.get('firewall_policy'):
             module.fail_json(
                 msg="'firewall_policy' parameter is required to update a firewall policy.")
+        for desired, imperative in (('rules', ('add_rules', 'remove_rules')),
+                                    ('server_ips', ('add_server_ips', 'remove_server_ips'))):
+            if module.params.get(desired) is not None and any(module.params.get(p) for p in imperative):
+                module.fail_json(
+                    msg="'%s' parameter cannot be combined with %s." % (desired, ' or '.join(imperative)))
         try:
             (changed, firewall_policy) = update_firewall_policy(module, oneandone_conn)
         except Exception as e:
@@ -540,7 +725,7 @@ def main():
         except Exception as e:
             module.fail_json(msg=str(e))
 
-    module.exit_json(changed=changed, firewall_policy=firewall_policy)
+    module.exit_json(changed=changed, firewall_policy=firewall_policy, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,343 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: oneandone_job_status
+short_description: Check 1&1 resources created without waiting.
+description:
+     - Checks the resources recorded in a job file by the other oneandone modules when
+       they ran with wait disabled, or given as jobs, and reports which of them are ready,
+       still pending or failed. Resources of the same type are checked together, with a
+       single listing when many of them are pending.
+       This module has a dependency on 1and1 >= 1.0
+version_added: "2.4"
+options:
+  auth_token:
+    description:
+      - Authenticating API token provided by 1&1.
+    required: true
+  api_url:
+    description:
+      - Custom API URL. Overrides the
+        ONEANDONE_API_URL environement variable.
+    required: false
+  job_file:
+    description:
+      - File the other oneandone modules appended the job handles to with their job_file option.
+    required: false
+  jobs:
+    description:
+      - List of job handles to check in addition to the job file. Each handle must contain
+        the id of the resource and its type, one of server, firewall_policy, load_balancer,
+        monitoring_policy, private_network, public_ip, vpn, user or role.
+    required: false
+  prune:
+    description:
+      - Remove the handles of ready resources from the job file.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  max_concurrency:
+    description:
+      - The maximum number of resources fetched in parallel.
+    required: false
+    default: 1
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  wait:
+    description:
+      - Wait for every resource to be ready, and fail if one of them fails or the wait
+        times out. Without wait, the resources are checked once.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  wait_timeout:
+    description:
+      - how long before wait gives up, in seconds
+    default: 600
+  wait_interval:
+    description:
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
+    default: 5
+
+requirements:
+     - "1and1"
+     - "python >= 2.6"
+
+author:
+  - Amel Ajdinovic (@aajdinov)
+  - Ethan Devenport (@edevenport)
+'''
+
+EXAMPLES = '''
+
+# Submit servers and a firewall policy without waiting, then wait for all of them.
+
+- oneandone_server:
+    auth_token: oneandone_private_api_key
+    hostname: node%02d
+    fixed_instance_size: S
+    datacenter: US
+    appliance: C5A349786169F140BCBC335675014C08
+    auto_increment: true
+    count: 50
+    wait: false
+    job_file: /tmp/oneandone_jobs
+
+- oneandone_firewall_policy:
+    auth_token: oneandone_private_api_key
+    name: ansible-firewall-policy
+    rules:
+     -
+       protocol: TCP
+       port_from: 80
+       port_to: 80
+       source: 0.0.0.0
+    wait: false
+    job_file: /tmp/oneandone_jobs
+
+- oneandone_job_status:
+    auth_token: oneandone_private_api_key
+    job_file: /tmp/oneandone_jobs
+    wait: true
+    wait_timeout: 1800
+    prune: true
+
+# Check a job handle returned by an earlier task once.
+
+- oneandone_job_status:
+    auth_token: oneandone_private_api_key
+    jobs:
+     -
+       type: server
+       id: "{{ server.machines[0].id }}"
+  register: status
+
+'''
+
+RETURN = '''
+changed:
+    description: True if handles were pruned from the job file
+    type: bool
+    sample: False
+    returned: always
+jobs:
+    description: The checked job handles with their status, one of ready, pending or failed
+    type: list
+    sample: '[{"type": "server", "id": "E7D36EC025C73796035BF4F171379025", "name": "node01", "status": "ready", "state": "POWERED_ON"}]'
+    returned: always
+ready:
+    description: Number of ready resources
+    type: int
+    sample: 50
+    returned: always
+pending:
+    description: Number of resources still being created
+    type: int
+    sample: 0
+    returned: always
+failed:
+    description: Number of resources that failed or no longer exist
+    type: int
+    sample: 0
+    returned: always
+'''
+
+import os
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    CreationWatcher,
+    HAS_ONEANDONE_SDK,
+    RESOURCE_STATES,
+    get_oneandone_connection,
+    get_resource_state,
+    read_jobs,
+    report_perf,
+    write_jobs)
+
+
+def _collect_jobs(module):
+    """
+    Returns the job handles of the job file and of the jobs parameter,
+    without duplicates.
+    """
+    job_file = module.params.get('job_file')
+    jobs = read_jobs(job_file) if job_file else []
+    seen = set(job['id'] for job in jobs)
+
+    for job in module.params.get('jobs'):
+        if not isinstance(job, dict) or 'id' not in job or 'type' not in job:
+            module.fail_json(msg='job handles must contain an id and a type.')
+        if job['id'] not in seen:
+            seen.add(job['id'])
+            jobs.append(job)
+
+    for job in jobs:
+        if job['type'] not in RESOURCE_STATES:
+            module.fail_json(msg='unknown job type %s.' % job['type'])
+
+    return jobs
+
+
+def check_jobs(module, oneandone_conn):
+    """
+    Checks the resources of the job handles, once or until they are all
+    ready.
+
+    module : AnsibleModule object
+    oneandone_conn: authenticated oneandone object
+
+    Returns whether the job file was pruned, the handles with their
+    status, and the error that ended the wait, if any.
+    """
+    job_file = module.params.get('job_file')
+    prune = module.params.get('prune')
+    wait = module.params.get('wait')
+    wait_timeout = module.params.get('wait_timeout')
+    wait_interval = module.params.get('wait_interval')
+    max_concurrency = module.params.get('max_concurrency')
+
+    jobs = _collect_jobs(module)
+
+    creation_watcher = CreationWatcher(oneandone_conn, max_concurrency)
+    for job in jobs:
+        creation_watcher.watch(job['type'], job['id'])
+
+    error = None
+    if wait:
+        try:
+            creation_watcher.wait(wait_timeout, wait_interval)
+        except Exception as ex:
+            error = str(ex)
+    else:
+        creation_watcher.poll()
+
+    results = []
+    for job in jobs:
+        result = dict(job)
+        resource = creation_watcher.resources.get(job['id'])
+        if resource is not None:
+            result['status'] = 'ready'
+            result['state'] = get_resource_state(job['type'], resource)
+        elif job['id'] in creation_watcher.failed:
+            result['status'] = 'failed'
+            result['msg'] = creation_watcher.failed[job['id']]
+        else:
+            result['status'] = 'pending'
+        results.append(result)
+
+    changed = False
+    if prune and job_file:
+        stored = read_jobs(job_file)
+        remaining = [job for job in stored
+                     if job['id'] not in creation_watcher.resources]
+        if len(remaining) < len(stored):
+            write_jobs(job_file, remaining)
+            changed = True
+
+    return (changed, results, error)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            auth_token=dict(
+                type='str',
+                default=os.environ.get('ONEANDONE_AUTH_TOKEN')),
+            api_url=dict(
+                type='str',
+                default=os.environ.get('ONEANDONE_API_URL')),
+            job_file=dict(type='path'),
+            jobs=dict(type='list', default=[]),
+            prune=dict(type='bool', default=False),
+            max_concurrency=dict(type='int', default=1),
+            wait=dict(type='bool', default=False),
+            wait_timeout=dict(type='int', default=600),
+            wait_interval=dict(type='int', default=5),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+        )
+    )
+
+    if not HAS_ONEANDONE_SDK:
+        module.fail_json(msg='1and1 required for this module')
+
+    if not module.params.get('auth_token'):
+        module.fail_json(
+            msg='auth_token parameter is required.')
+
+    if not module.params.get('job_file') and not module.params.get('jobs'):
+        module.fail_json(
+            msg="'job_file' or 'jobs' parameter is required.")
+
+    if module.params.get('max_concurrency') < 1:
+        module.fail_json(
+            msg="'max_concurrency' parameter must be at least 1.")
+
+    oneandone_conn = get_oneandone_connection(module)
+
+    try:
+        (changed, jobs, error) = check_jobs(module, oneandone_conn)
+    except Exception as ex:
+        module.fail_json(msg=str(ex))
+
+    counts = dict((status, len([job for job in jobs if job['status'] == status]))
+                  for status in ('ready', 'pending', 'failed'))
+
+    if error:
+        module.fail_json(msg=error, jobs=jobs, **counts)
+
+    module.exit_json(changed=changed, jobs=jobs, **dict(counts, **report_perf(module, oneandone_conn)))
+
+
+if __name__ == '__main__':
+    main()
@@ -143,6 +143,59 @@ options:
     description:
       - A list of rule ids that will be removed from an existing load balancer. Used in combination with update state.
     required: false
+  catalog_cache_ttl:
+    description:
+      - Number of seconds datacenter, appliance and fixed instance size listings are kept
+        in an on-disk cache shared by all tasks. The default of 0 disables the cache.
+    required: false
+    default: 0
+  catalog_cache_dir:
+    description:
+      - Directory of the on-disk catalog cache.
+    required: false
+    default: ~/.ansible/cache/oneandone
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -155,7 +208,8 @@ options:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -369,9 +423,16 @@ EXAMPLES = '''
     state: update
 '''
 
-import time
 import os
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    find_resource,
+    find_resources,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    wait_for_resource_creation_completion)
 
 HAS_ONEANDONE_SDK = True
 
@@ -385,51 +446,13 @@ HEALTH_CHECK_TESTS = ['NONE', 'TCP', 'HTTP', 'ICMP']
 METHODS = ['ROUND_ROBIN', 'LEAST_CONNECTIONS']
 
 
-def _wait_for_load_balancer_creation_completion(oneandone_conn, load_balancer, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the load balancer info
-        load_balancer = oneandone_conn.get_load_balancer(load_balancer['id'])
-
-        if load_balancer['state'].lower() == 'active':
-            return
-        elif load_balancer['state'].lower() == 'failed':
-            raise Exception('Load balancer creation ' +
-                            ' failed for %s' % load_balancer['id'])
-        elif load_balancer['state'].lower() in ('enabled',
-                                                'deploying',
-                                                'configuring'):
-            continue
-        else:
-            raise Exception(
-                'Unknown load balancer state %s' % load_balancer['state'])
-
-    raise Exception(
-        'Timed out waiting for load balancer competion for %s' % load_balancer['id'])
-
-
-def _find_machine(oneandone_conn, instance):
-    """
-    Validates that the machine exists whether by ID or name.
-    Returns the machine if one was found.
-    """
-    for _machine in oneandone_conn.list_servers(per_page=1000):
-        if instance in (_machine['id'], _machine['name']):
-            return _machine
-
-
 def _find_load_balancer(oneandone_conn, load_balancer):
     """
     Given a name, validates that the load balancer exists
     whether it is a proper ID or a name.
     Returns the load_balancer if one was found, else None.
     """
-    for _load_balancer in oneandone_conn.list_load_balancers(per_page=1000):
-        if load_balancer in (_load_balancer['id'],
-                             _load_balancer['name']):
-            return _load_balancer
+    return find_resource(oneandone_conn, 'load_balancers', load_balancer)
 
 
 def _find_datacenter(oneandone_conn, datacenter):
@@ -437,9 +460,9 @@ def _find_datacenter(oneandone_conn, datacenter):
     Validates the datacenter exists by ID or name.
     Returns the datacenter ID.
     """
-    for _datacenter in oneandone_conn.list_datacenters():
-        if datacenter in (_datacenter['id'], _datacenter['country_code']):
-            return _datacenter['id']
+    _datacenter = find_resource(oneandone_conn, 'datacenters', datacenter)
+    if _datacenter:
+        return _datacenter['id']
 
 
 def _add_server_ips(module, oneandone_conn, load_balancer_id, server_ids):
@@ -449,8 +472,7 @@ def _add_server_ips(module, oneandone_conn, load_balancer_id, server_ids):
     try:
         attach_servers = []
 
-        for server_id in server_ids:
-            server = _find_machine(oneandone_conn, server_id)
+        for server in find_resources(oneandone_conn, 'servers', server_ids):
             attach_server = oneandone.client.AttachServer(
                 server_id=server['id'],
                 server_ip_id=next(iter(server['ips'] or []), None)['id']
@@ -572,7 +594,6 @@ def update_load_balancer(module, oneandone_conn):
                                          oneandone_conn,
                                          load_balancer['id'],
                                          server_ip_id)
-            load_balancer = _find_load_balancer(oneandone_conn, load_balancer['id'])
         changed = True
 
     if add_rules:
@@ -588,10 +609,15 @@ def update_load_balancer(module, oneandone_conn):
                                        oneandone_conn,
                                        load_balancer['id'],
                                        rule_id)
-            load_balancer = _find_load_balancer(oneandone_conn, load_balancer['id'])
         changed = True
 
     try:
+        if changed:
+            invalidate_resources(oneandone_conn, 'load_balancers')
+        if remove_server_ips or remove_rules:
+            # Removals are issued back to back; fetch the final state once.
+            load_balancer = oneandone_conn.get_load_balancer(load_balancer['id'])
+
         return (changed, load_balancer)
     except Exception as ex:
         module.fail_json(msg=str(ex))
@@ -654,10 +680,17 @@ def create_load_balancer(module, oneandone_conn):
             load_balancer=load_balancer_obj,
             load_balancer_rules=load_balancer_rules
         )
+        invalidate_resources(oneandone_conn, 'load_balancers')
 
         if wait:
-            _wait_for_load_balancer_creation_completion(
-                oneandone_conn, load_balancer, wait_timeout, wait_interval)
+            load_balancer = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'load_balancer',
+                load_balancer['id'],
+                wait_timeout,
+                wait_interval)
+        else:
+            record_job(module, 'load_balancer', load_balancer)
 
         changed = True if load_balancer else False
 
@@ -677,6 +710,7 @@ def remove_load_balancer(module, oneandone_conn):
         lb_id = module.params.get('name')
         load_balancer = _find_load_balancer(oneandone_conn, lb_id)
         load_balancer = oneandone_conn.delete_load_balancer(load_balancer['id'])
+        invalidate_resources(oneandone_conn, 'load_balancers')
 
         changed = True if load_balancer else False
 
@@ -719,6 +753,23 @@ def main():
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            catalog_cache_ttl=dict(type='int', default=0),
+            catalog_cache_dir=dict(type='path', default='~/.ansible/cache/oneandone'),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -730,12 +781,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -767,7 +813,7 @@ def main():
         except Exception as ex:
             module.fail_json(msg=str(ex))
 
-    module.exit_json(changed=changed, load_balancer=load_balancer)
+    module.exit_json(changed=changed, load_balancer=load_balancer, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
@@ -237,6 +237,10 @@ options:
   ports:
     description:
       - Array of ports that will be monitoring.
+      - With update state, the complete list of ports the monitoring policy should have.
+        Ports are matched by protocol and port; missing ports are added, ports with other
+        alert_if or email_notification values are modified, and ports that are not listed
+        are removed. Cannot be combined with add_ports, update_ports or remove_ports.
     required: true
     suboptions:
       protocol:
@@ -262,6 +266,9 @@ options:
   processes:
     description:
       - Array of processes that will be monitoring.
+      - With update state, the complete list of processes the monitoring policy should have,
+        matched by process name like ports. Cannot be combined with add_processes,
+        update_processes or remove_processes.
     required: true
     suboptions:
       process:
@@ -274,6 +281,54 @@ options:
           - Case of alert.
         choices: [ "RUNNING", "NOT_RUNNING" ]
         required: true
+  max_concurrency:
+    description:
+      - The maximum number of port and process modifications, port and process removals,
+        and server detachments issued in parallel with update state.
+    required: false
+    default: 1
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -286,7 +341,8 @@ options:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -749,11 +805,46 @@ EXAMPLES = '''
      - server01
     wait: true
     state: update
+
+# Make the ports and processes of a monitoring policy match a list.
+# Unlisted ports and processes are removed.
+
+- oneandone_moitoring_policy:
+    auth_token: oneandone_private_api_key
+    monitoring_policy: ansible monitoring policy updated
+    ports:
+     -
+       protocol: TCP
+       port: 22
+       alert_if: NOT_RESPONDING
+       email_notification: true
+     -
+       protocol: TCP
+       port: 443
+       alert_if: NOT_RESPONDING
+       email_notification: true
+    processes:
+     -
+       process: nginx
+       alert_if: NOT_RUNNING
+       email_notification: true
+    max_concurrency: 5
+    state: update
 '''
 
 import os
-import time
+from functools import partial
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    current_resource,
+    find_resource,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    resolve_server_ids,
+    run_concurrently,
+    wait_for_resource_creation_completion)
 
 HAS_ONEANDONE_SDK = True
 
@@ -763,105 +854,48 @@ except ImportError:
     HAS_ONEANDONE_SDK = False
 
 
-def _wait_for_monitoring_policy_creation_completion(oneandone_conn, monitoring_policy, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the monitoring policy info
-        monitoring_policy = oneandone_conn.get_monitoring_policy(monitoring_policy['id'])
-
-        if monitoring_policy['state'].lower() == 'active':
-            return
-        elif monitoring_policy['state'].lower() == 'failed':
-            raise Exception('Monitoring policy creation ' +
-                            ' failed for %s' % monitoring_policy['id'])
-        elif monitoring_policy['state'].lower() in ('enabled',
-                                                    'deploying',
-                                                    'configuring'):
-            continue
-        else:
-            raise Exception(
-                'Unknown monitoring policy state %s' % monitoring_policy['state'])
-
-    raise Exception(
-        'Timed out waiting for monitoring policy competion for %s' % monitoring_policy['id'])
-
-
 def _find_monitoring_policy(oneandone_conn, monitoring_policy):
     """
     Given a name, validates that the monitoring policy exists
     whether it is a proper ID or a name.
     Returns the monitoring_policy if one was found, else None.
     """
-    for _monitoring_policy in oneandone_conn.list_monitoring_policies(per_page=1000):
-        if monitoring_policy in (_monitoring_policy['id'], _monitoring_policy['name']):
-            return _monitoring_policy
+    return find_resource(oneandone_conn, 'monitoring_policies', monitoring_policy)
 
 
-def _find_machine(oneandone_conn, instance):
+def _port_object(port):
     """
-    Validates that the machine exists whether by ID or name.
-    Returns the machine id if found.
+    Builds the SDK object of a monitoring policy port.
     """
-    for _machine in oneandone_conn.list_servers(per_page=1000):
-        if instance in (_machine['id'], _machine['name']):
-            return _machine['id']
-
-
-def _add_ports(module, oneandone_conn, monitoring_policy_id, ports):
-    """
-    Adds new ports to a monitoring policy.
-    """
-    try:
-        monitoring_policy_ports = []
-
-        for _port in ports:
-            monitoring_policy_port = oneandone.client.Port(
-                protocol=_port['protocol'],
-                port=_port['port'],
-                alert_if=_port['alert_if'],
-                email_notification=_port['email_notification']
-            )
-            monitoring_policy_ports.append(monitoring_policy_port)
-
-        monitoring_policy = oneandone_conn.add_port(
-            monitoring_policy_id=monitoring_policy_id,
-            ports=monitoring_policy_ports)
-        return monitoring_policy
-    except Exception as ex:
-        module.fail_json(msg=str(ex))
+    return oneandone.client.Port(
+        protocol=port['protocol'],
+        port=port['port'],
+        alert_if=port['alert_if'],
+        email_notification=port['email_notification']
+    )
 
 
-def _delete_monitoring_policy_port(module, oneandone_conn, monitoring_policy_id, port_id):
+def _process_object(process):
     """
-    Removes a port from a monitoring policy.
+    Builds the SDK object of a monitoring policy process.
     """
-    try:
-        monitoring_policy = oneandone_conn.delete_monitoring_policy_port(
-            monitoring_policy_id=monitoring_policy_id,
-            port_id=port_id)
-        return monitoring_policy
-    except Exception as ex:
-        module.fail_json(msg=str(ex))
+    return oneandone.client.Process(
+        process=process['process'],
+        alert_if=process['alert_if'],
+        email_notification=process['email_notification']
+    )
 
 
-def _modify_port(module, oneandone_conn, monitoring_policy_id, port_id, port):
+def _add_ports(module, oneandone_conn, monitoring_policy_id, ports):
     """
-    Modifies a monitoring policy port.
+    Adds new ports to a monitoring policy.
     """
     try:
-        monitoring_policy_port = oneandone.client.Port(
-            protocol=port['protocol'],
-            port=port['port'],
-            alert_if=port['alert_if'],
-            email_notification=port['email_notification']
-        )
+        monitoring_policy_ports = [_port_object(_port) for _port in ports]
 
-        monitoring_policy = oneandone_conn.modify_port(
+        monitoring_policy = oneandone_conn.add_port(
             monitoring_policy_id=monitoring_policy_id,
-            port_id=port_id,
-            port=monitoring_policy_port)
+            ports=monitoring_policy_ports)
         return monitoring_policy
     except Exception as ex:
         module.fail_json(msg=str(ex))
@@ -872,15 +906,7 @@ def _add_processes(module, oneandone_conn, monitoring_policy_id, processes):
     Adds new processes to a monitoring policy.
     """
     try:
-        monitoring_policy_processes = []
-
-        for _process in processes:
-            monitoring_policy_process = oneandone.client.Process(
-                process=_process['process'],
-                alert_if=_process['alert_if'],
-                email_notification=_process['email_notification']
-            )
-            monitoring_policy_processes.append(monitoring_policy_process)
+        monitoring_policy_processes = [_process_object(_process) for _process in processes]
 
         monitoring_policy = oneandone_conn.add_process(
             monitoring_policy_id=monitoring_policy_id,
@@ -890,48 +916,24 @@ def _add_processes(module, oneandone_conn, monitoring_policy_id, processes):
         module.fail_json(msg=str(ex))
 
 
-def _delete_monitoring_policy_process(module, oneandone_conn, monitoring_policy_id, process_id):
+def _attached_server_ids(monitoring_policy):
     """
-    Removes a process from a monitoring policy.
+    Returns the IDs of the servers attached to a monitoring policy, or
+    None when the policy does not list them.
     """
-    try:
-        monitoring_policy = oneandone_conn.delete_monitoring_policy_process(
-            monitoring_policy_id=monitoring_policy_id,
-            process_id=process_id)
-        return monitoring_policy
-    except Exception as ex:
-        module.fail_json(msg=str(ex))
+    if monitoring_policy.get('servers') is None:
+        return None
+    return set(server['id'] for server in monitoring_policy['servers'])
 
 
-def _modify_process(module, oneandone_conn, monitoring_policy_id, process_id, process):
-    """
-    Modifies a monitoring policy process.
-    """
-    try:
-        monitoring_policy_process = oneandone.client.Process(
-            process=process['process'],
-            alert_if=process['alert_if'],
-            email_notification=process['email_notification']
-        )
-
-        monitoring_policy = oneandone_conn.modify_process(
-            monitoring_policy_id=monitoring_policy_id,
-            process_id=process_id,
-            process=monitoring_policy_process)
-        return monitoring_policy
-    except Exception as ex:
-        module.fail_json(msg=str(ex))
-
-
-def _attach_monitoring_policy_server(module, oneandone_conn, monitoring_policy_id, servers):
+def _attach_monitoring_policy_server(module, oneandone_conn, monitoring_policy_id, server_ids):
     """
     Attaches servers to a monitoring policy.
     """
     try:
         attach_servers = []
 
-        for _server_id in servers:
-            server_id = _find_machine(oneandone_conn, _server_id)
+        for server_id in server_ids:
             attach_server = oneandone.client.AttachServer(
                 server_id=server_id
             )
@@ -945,26 +947,112 @@ def _attach_monitoring_policy_server(module, oneandone_conn, monitoring_policy_i
         module.fail_json(msg=str(ex))
 
 
-def _detach_monitoring_policy_server(module, oneandone_conn, monitoring_policy_id, server_id):
+def _port_key(port):
+    return (str(port['protocol']).upper(), int(port['port']))
+
+
+def _process_key(process):
+    return process['process']
+
+
+def _alert_settings(item):
+    return (str(item.get('alert_if')).upper(),
+            str(item.get('email_notification')).lower() in ('true', 'yes', '1'))
+
+
+def _diff_items(current, desired, key):
     """
-    Detaches a server from a monitoring policy.
+    Compares the current ports or processes of a monitoring policy with
+    the desired ones. Returns the items to add, the (id, item) pairs to
+    modify, and the ids of the items to remove.
     """
-    try:
-        monitoring_policy = oneandone_conn.detach_monitoring_policy_server(
-            monitoring_policy_id=monitoring_policy_id,
-            server_id=server_id)
-        return monitoring_policy
-    except Exception as ex:
-        module.fail_json(msg=str(ex))
+    current_by_key = dict((key(item), item) for item in current or [])
+    desired_keys = set()
+    add_items = []
+    modify_items = []
+
+    for item in desired:
+        item_key = key(item)
+        if item_key in desired_keys:
+            continue
+        desired_keys.add(item_key)
+
+        existing = current_by_key.get(item_key)
+        if existing is None:
+            add_items.append(item)
+        elif _alert_settings(existing) != _alert_settings(item):
+            modify_items.append((existing['id'], item))
+
+    remove_ids = [item['id'] for item in current or []
+                  if key(item) not in desired_keys]
+
+    return (add_items, modify_items, remove_ids)
+
+
+def _run_calls(calls, max_concurrency):
+    """
+    Runs the given argument-less calls through the shared worker pool.
+    """
+    return run_concurrently(lambda call: call(), calls, max_concurrency)
+
+
+def _sync_monitoring_policy_items(module, oneandone_conn, monitoring_policy,
+                                  ports, processes, max_concurrency):
+    """
+    Makes the ports and processes of a monitoring policy match the
+    desired ones, when given. All new ports, and all new processes, are
+    added with a single call each; modifications and removals run
+    concurrently.
+
+    Returns whether anything was added, whether anything was modified or
+    removed, and the monitoring policy returned by the last addition.
+    """
+    monitoring_policy_id = monitoring_policy['id']
+    add_ports = add_processes = []
+    calls = []
+
+    if ports is not None:
+        (add_ports, modify_ports, remove_ports) = _diff_items(
+            monitoring_policy['ports'], ports, _port_key)
+        for port_id, port in modify_ports:
+            calls.append(partial(oneandone_conn.modify_port,
+                                 monitoring_policy_id=monitoring_policy_id,
+                                 port_id=port_id,
+                                 port=_port_object(port)))
+        for port_id in remove_ports:
+            calls.append(partial(oneandone_conn.delete_monitoring_policy_port,
+                                 monitoring_policy_id=monitoring_policy_id,
+                                 port_id=port_id))
+
+    if processes is not None:
+        (add_processes, modify_processes, remove_processes) = _diff_items(
+            monitoring_policy['processes'], processes, _process_key)
+        for process_id, process in modify_processes:
+            calls.append(partial(oneandone_conn.modify_process,
+                                 monitoring_policy_id=monitoring_policy_id,
+                                 process_id=process_id,
+                                 process=_process_object(process)))
+        for process_id in remove_processes:
+            calls.append(partial(oneandone_conn.delete_monitoring_policy_process,
+                                 monitoring_policy_id=monitoring_policy_id,
+                                 process_id=process_id))
+
+    if add_ports:
+        monitoring_policy = _add_ports(module, oneandone_conn, monitoring_policy_id, add_ports)
+    if add_processes:
+        monitoring_policy = _add_processes(module, oneandone_conn, monitoring_policy_id, add_processes)
+    _run_calls(calls, max_concurrency)
+
+    return (bool(add_ports or add_processes), bool(calls), monitoring_policy)
 
 
 def update_monitoring_policy(module, oneandone_conn):
     """
     Updates a monitoring_policy based on input arguments.
     Monitoring policy ports, processes and servers can be added/removed to/from
-    a monitoring policy. Monitoring policy name, description, email,
-    thresholds for cpu, ram, disk, transfer and internal_ping
-    can be updated as well.
+    a monitoring policy, and ports and processes can be set to a desired
+    list. Monitoring policy name, description, email, thresholds for cpu,
+    ram, disk, transfer and internal_ping can be updated as well.
 
     module : AnsibleModule object
     oneandone_conn: authenticated oneandone object
@@ -983,10 +1071,17 @@ def update_monitoring_policy(module, oneandone_conn):
         remove_processes = module.params.get('remove_processes')
         add_servers = module.params.get('add_servers')
         remove_servers = module.params.get('remove_servers')
+        ports = module.params.get('ports')
+        processes = module.params.get('processes')
+        max_concurrency = module.params.get('max_concurrency')
 
         changed = False
+        refresh = False
 
         monitoring_policy = _find_monitoring_policy(oneandone_conn, monitoring_policy_id)
+        if monitoring_policy is None:
+            module.fail_json(msg='monitoring policy %s not found.' % monitoring_policy_id)
+        monitoring_policy = current_resource(oneandone_conn, 'monitoring_policies', monitoring_policy)
 
         _monitoring_policy = oneandone.client.MonitoringPolicy(
             name=name,
@@ -1018,68 +1113,82 @@ def update_monitoring_policy(module, oneandone_conn):
                 thresholds=_thresholds)
             changed = True
 
+        if ports is not None or processes is not None:
+            (added, refresh, monitoring_policy) = _sync_monitoring_policy_items(
+                module,
+                oneandone_conn,
+                monitoring_policy,
+                ports,
+                processes,
+                max_concurrency)
+            changed = changed or added or refresh
+
         if add_ports:
             monitoring_policy = _add_ports(module, oneandone_conn, monitoring_policy['id'], add_ports)
             changed = True
 
         if update_ports:
-            for update_port in update_ports:
-                _modify_port(module,
-                             oneandone_conn,
-                             monitoring_policy['id'],
-                             update_port['id'],
-                             update_port)
-            monitoring_policy = _find_monitoring_policy(oneandone_conn, monitoring_policy['id'])
-            changed = True
+            _run_calls([partial(oneandone_conn.modify_port,
+                                monitoring_policy_id=monitoring_policy['id'],
+                                port_id=update_port['id'],
+                                port=_port_object(update_port))
+                        for update_port in update_ports], max_concurrency)
+            changed = refresh = True
 
         if remove_ports:
-            for port_id in remove_ports:
-                _delete_monitoring_policy_port(module,
-                                               oneandone_conn,
-                                               monitoring_policy['id'],
-                                               port_id)
-            monitoring_policy = _find_monitoring_policy(oneandone_conn, monitoring_policy['id'])
-            changed = True
+            _run_calls([partial(oneandone_conn.delete_monitoring_policy_port,
+                                monitoring_policy_id=monitoring_policy['id'],
+                                port_id=port_id)
+                        for port_id in remove_ports], max_concurrency)
+            changed = refresh = True
 
         if add_processes:
             monitoring_policy = _add_processes(module, oneandone_conn, monitoring_policy['id'], add_processes)
             changed = True
 
         if update_processes:
-            for update_process in update_processes:
-                _modify_process(module,
-                                oneandone_conn,
-                                monitoring_policy['id'],
-                                update_process['id'],
-                                update_process)
-            monitoring_policy = _find_monitoring_policy(oneandone_conn, monitoring_policy['id'])
-            changed = True
+            _run_calls([partial(oneandone_conn.modify_process,
+                                monitoring_policy_id=monitoring_policy['id'],
+                                process_id=update_process['id'],
+                                process=_process_object(update_process))
+                        for update_process in update_processes], max_concurrency)
+            changed = refresh = True
 
         if remove_processes:
-            for process_id in remove_processes:
-                _delete_monitoring_policy_process(module,
-                                                  oneandone_conn,
-                                                  monitoring_policy['id'],
-                                                  process_id)
-            monitoring_policy = _find_monitoring_policy(oneandone_conn, monitoring_policy['id'])
-            changed = True
+            _run_calls([partial(oneandone_conn.delete_monitoring_policy_process,
+                                monitoring_policy_id=monitoring_policy['id'],
+                                process_id=process_id)
+                        for process_id in remove_processes], max_concurrency)
+            changed = refresh = True
 
         if add_servers:
-            monitoring_policy = _attach_monitoring_policy_server(module,
-                                                                 oneandone_conn,
-                                                                 monitoring_policy['id'],
-                                                                 add_servers)
-            changed = True
+            attached = _attached_server_ids(monitoring_policy) or set()
+            server_ids = [server_id for server_id in resolve_server_ids(module, oneandone_conn, add_servers)
+                          if server_id not in attached]
+            if server_ids:
+                monitoring_policy = _attach_monitoring_policy_server(module,
+                                                                     oneandone_conn,
+                                                                     monitoring_policy['id'],
+                                                                     server_ids)
+                changed = True
 
         if remove_servers:
-            for _server_id in remove_servers:
-                server_id = _find_machine(oneandone_conn, _server_id)
-                _detach_monitoring_policy_server(module,
-                                                 oneandone_conn,
-                                                 monitoring_policy['id'],
-                                                 server_id)
-            monitoring_policy = _find_monitoring_policy(oneandone_conn, monitoring_policy['id'])
-            changed = True
+            attached = _attached_server_ids(monitoring_policy)
+            server_ids = [server_id for server_id in resolve_server_ids(module, oneandone_conn, remove_servers)
+                          if attached is None or server_id in attached]
+            if server_ids:
+                _run_calls([partial(oneandone_conn.detach_monitoring_policy_server,
+                                    monitoring_policy_id=monitoring_policy['id'],
+                                    server_id=server_id)
+                            for server_id in server_ids], max_concurrency)
+                changed = refresh = True
+
+        if changed:
+            invalidate_resources(oneandone_conn, 'monitoring_policies')
+        if refresh:
+            # Modifications and removals are issued back to back or in
+            # parallel; fetch the final state once.
+            monitoring_policy = oneandone_conn.get_monitoring_policy(monitoring_policy['id'])
 
         return (changed, monitoring_policy)
     except Exception as ex:
@@ -1127,7 +1236,7 @@ def create_monitoring_policy(module, oneandone_conn):
                 _thresholds.append(_threshold)
 
         _ports = []
-        for port in ports:
+        for port in ports or []:
             _port = oneandone.client.Port(
                 protocol=port['protocol'],
                 port=port['port'],
@@ -1136,7 +1245,7 @@ def create_monitoring_policy(module, oneandone_conn):
             _ports.append(_port)
 
         _processes = []
-        for process in processes:
+        for process in processes or []:
             _process = oneandone.client.Process(
                 process=process['process'],
                 alert_if=process['alert_if'],
@@ -1149,13 +1258,17 @@ def create_monitoring_policy(module, oneandone_conn):
             ports=_ports,
             processes=_processes
         )
+        invalidate_resources(oneandone_conn, 'monitoring_policies')
 
         if wait:
-            _wait_for_monitoring_policy_creation_completion(
+            monitoring_policy = wait_for_resource_creation_completion(
                 oneandone_conn,
-                monitoring_policy,
+                'monitoring_policy',
+                monitoring_policy['id'],
                 wait_timeout,
                 wait_interval)
+        else:
+            record_job(module, 'monitoring_policy', monitoring_policy)
 
         changed = True if monitoring_policy else False
 
@@ -1175,6 +1288,7 @@ def remove_monitoring_policy(module, oneandone_conn):
         mp_id = module.params.get('name')
         monitoring_policy = _find_monitoring_policy(oneandone_conn, mp_id)
         monitoring_policy = oneandone_conn.delete_monitoring_policy(monitoring_policy['id'])
+        invalidate_resources(oneandone_conn, 'monitoring_policies')
 
         changed = True if monitoring_policy else False
 
@@ -1201,8 +1315,8 @@ def main():
             email=dict(type='str'),
             description=dict(type='str'),
             thresholds=dict(type='list', default=[]),
-            ports=dict(type='list', default=[]),
-            processes=dict(type='list', default=[]),
+            ports=dict(type='list'),
+            processes=dict(type='list'),
             add_ports=dict(type='list', default=[]),
             update_ports=dict(type='list', default=[]),
             remove_ports=dict(type='list', default=[]),
@@ -1211,9 +1325,25 @@ def main():
             remove_processes=dict(type='list', default=[]),
             add_servers=dict(type='list', default=[]),
             remove_servers=dict(type='list', default=[]),
+            max_concurrency=dict(type='int', default=1),
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -1225,12 +1355,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -1246,6 +1371,14 @@ def main():
         if not module.params.get('monitoring_policy'):
             module.fail_json(
                 msg="'monitoring_policy' parameter is required to update a monitoring policy.")
+        for desired, imperative in (('ports', ('add_ports', 'update_ports', 'remove_ports')),
+                                    ('processes', ('add_processes', 'update_processes', 'remove_processes'))):
+            if module.params.get(desired) is not None and any(module.params.get(p) for p in imperative):
+                module.fail_json(
+                    msg="'%s' parameter cannot be combined with %s." % (desired, ', '.join(imperative)))
+        if module.params.get('max_concurrency') < 1:
+            module.fail_json(
+                msg="'max_concurrency' parameter must be at least 1.")
         try:
             (changed, monitoring_policy) = update_monitoring_policy(module, oneandone_conn)
         except Exception as ex:
@@ -1261,7 +1394,7 @@ def main():
         except Exception as ex:
             module.fail_json(msg=str(ex))
 
-    module.exit_json(changed=changed, monitoring_policy=monitoring_policy)
+    module.exit_json(changed=changed, monitoring_policy=monitoring_policy, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
@@ -67,6 +67,71 @@ options:
   remove_members:
     description:
       - List of server identifiers (name or id) to be removed from the private network.
+  members:
+    description:
+      - Complete list of server identifiers (name or id) the private network should have
+        with update state. Missing servers are attached with a single call and servers that
+        are not listed are detached. An empty list detaches every server. Cannot be combined
+        with add_members or remove_members.
+    required: false
+  max_concurrency:
+    description:
+      - The maximum number of servers detached from the private network in parallel.
+    required: false
+    default: 1
+  catalog_cache_ttl:
+    description:
+      - Number of seconds datacenter, appliance and fixed instance size listings are kept
+        in an on-disk cache shared by all tasks. The default of 0 disables the cache.
+    required: false
+    default: 0
+  catalog_cache_dir:
+    description:
+      - Directory of the on-disk catalog cache.
+    required: false
+    default: ~/.ansible/cache/oneandone
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -79,7 +144,8 @@ options:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -135,6 +201,17 @@ EXAMPLES = '''
     remove_members:
      - server identifier (id or name)
 
+# Make the members of the private network match a list.
+
+- oneandone_private_network:
+    auth_token: oneandone_private_api_key
+    state: update
+    private_network: backup_network
+    members:
+     - server identifier (id or name)
+     - server identifier (id or name)
+    max_concurrency: 5
+
 '''
 
 RETURN = '''
@@ -148,11 +225,26 @@ private_network:
     type: array
     sample: '[{"name": "backup_network", "id": "55726DEDA20C99CF6F2AF8F18CAC9963"}]'
     returned: always
+perf:
+    description: API call counts and timings of the task
+    type: dict
+    sample: '{"api_calls": 3, "api_time": 0.84, "sleep_time": 5.0, "calls": {"get_server": {"count": 2}}}'
+    returned: when perf is true
 '''
 
-import time
 import os
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    DeletionWatcher,
+    current_resource,
+    find_resource,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    resolve_server_ids,
+    run_concurrently,
+    wait_for_resource_creation_completion)
 
 HAS_ONEANDONE_SDK = True
 
@@ -169,9 +261,9 @@ def _find_datacenter(oneandone_conn, datacenter):
     Validates the datacenter exists by ID or country code.
     Returns the datacenter ID.
     """
-    for _datacenter in oneandone_conn.list_datacenters():
-        if datacenter in (_datacenter['id'], _datacenter['country_code']):
-            return _datacenter['id']
+    _datacenter = find_resource(oneandone_conn, 'datacenters', datacenter)
+    if _datacenter:
+        return _datacenter['id']
 
 
 def _find_private_network(oneandone_conn, private_network):
@@ -179,67 +271,18 @@ def _find_private_network(oneandone_conn, private_network):
     Validates the private network exists by ID or name.
     Return the private network if one was found.
     """
-    for _private_network in oneandone_conn.list_private_networks(per_page=1000):
-        if private_network in (_private_network['id'], _private_network['name']):
-            return _private_network
-
-
-def _wait_for_network_creation_completion(oneandone_conn,
-                                          network, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the network info
-        network = oneandone_conn.get_private_network(network['id'])
-
-        if network['state'].lower() == 'active':
-            return
-        elif network['state'].lower() == 'failed':
-            raise Exception('Private network creation ' +
-                            ' failed for %s' % network['id'])
-        elif network['state'].lower() in ('enabled',
-                                          'deploying',
-                                          'configuring'):
-            continue
-        else:
-            raise Exception(
-                'Unknown network state %s' % network['state'])
-
-    raise Exception(
-        'Timed out waiting for network competion for %s' % network['id'])
+    return find_resource(oneandone_conn, 'private_networks', private_network)
 
 
 def _wait_for_network_deletion_completion(oneandone_conn,
                                           network,
                                           wait_timeout):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(5)
-
-        # Refresh the operation info
-        logs = oneandone_conn.list_logs(q='DELETE',
-                                        period='LAST_HOUR',
-                                        sort='-start_date')
-
-        for log in logs:
-            if (log['resource']['id'] == network['id'] and
-                    log['action'] == 'DELETE' and
-                    log['type'] == 'PRIVATENETWORK' and
-                    log['status']['state'] == 'OK'):
-                return
-    raise Exception(
-        'Timed out waiting for network deletion for %s' % network['id'])
-
-
-def _find_machine(oneandone_conn, instance):
-    """
-    Validates that the machine exists whether by ID or name.
-    Returns the machine if one was found.
-    """
-    for _machine in oneandone_conn.list_servers(per_page=1000):
-        if instance in (_machine['id'], _machine['name']):
-            return _machine
+    deletion_watcher = DeletionWatcher(oneandone_conn,
+                                       'PRIVATENETWORK',
+                                       'get_private_network',
+                                       'network')
+    deletion_watcher.watch(network['id'])
+    deletion_watcher.wait(wait_timeout)
 
 
 def _add_member(module, oneandone_conn, name, members):
@@ -254,16 +297,16 @@ def _add_member(module, oneandone_conn, name, members):
         module.fail_json(msg=str(e))
 
 
-def _remove_member(module, oneandone_conn, name, member_id):
-    try:
-        conn = oneandone_conn
-
-        network = conn.remove_private_network_server(private_network_id=name,
-                                                     server_id=member_id)
+def _detach_members(oneandone_conn, name, member_ids, max_concurrency):
+    """
+    Detaches servers from a private network, up to max_concurrency at a
+    time.
+    """
+    def _remove_member(member_id):
+        return oneandone_conn.remove_private_network_server(private_network_id=name,
+                                                            server_id=member_id)
 
-        return network
-    except Exception as ex:
-        module.fail_json(msg=str(ex))
+    run_concurrently(_remove_member, member_ids, max_concurrency)
 
 
 def create_network(module, oneandone_conn):
@@ -300,15 +343,17 @@ def create_network(module, oneandone_conn):
                 subnet_mask=subnet_mask,
                 datacenter_id=datacenter_id
             ))
+        invalidate_resources(oneandone_conn, 'private_networks')
 
         if wait:
-            _wait_for_network_creation_completion(
+            network = wait_for_resource_creation_completion(
                 oneandone_conn,
-                network,
+                'private_network',
+                network['id'],
                 wait_timeout,
                 wait_interval)
-            network = _find_private_network(oneandone_conn,
-                                            network['id'])
+        else:
+            record_job(module, 'private_network', network)
 
         changed = True if network else False
 
@@ -331,11 +376,17 @@ def update_network(module, oneandone_conn):
     _subnet_mask = module.params.get('subnet_mask')
     _add_members = module.params.get('add_members')
     _remove_members = module.params.get('remove_members')
+    _members = module.params.get('members')
+    max_concurrency = module.params.get('max_concurrency')
 
     try:
         network = _find_private_network(oneandone_conn,
                                         _private_network_id)
+        if network is None:
+            module.fail_json(msg='private network %s not found.' % _private_network_id)
+        network = current_resource(oneandone_conn, 'private_networks', network)
         updated_network = None
+        detached = False
 
         if _name or _description or _network_address or _subnet_mask:
             updated_network = oneandone_conn.modify_private_network(
@@ -345,26 +396,33 @@ def update_network(module, oneandone_conn):
                 network_address=_network_address,
                 subnet_mask=_subnet_mask)
 
-        if _add_members:
-            instances = []
-
-            for member in _add_members:
-                instance = _find_machine(oneandone_conn, member)
-                instance_obj = oneandone.client.AttachServer(server_id=instance['id'])
+        if _members is not None:
+            current_ids = [server['id'] for server in
+                           oneandone_conn.list_private_network_servers(private_network_id=network['id'])]
+            desired_ids = resolve_server_ids(module, oneandone_conn, _members)
+            _add_members = [server_id for server_id in desired_ids if server_id not in current_ids]
+            _remove_members = [server_id for server_id in current_ids if server_id not in desired_ids]
+        else:
+            _add_members = resolve_server_ids(module, oneandone_conn, _add_members or [])
+            _remove_members = resolve_server_ids(module, oneandone_conn, _remove_members or [])
 
-                instances.extend([instance_obj])
+        if _add_members:
+            instances = [oneandone.client.AttachServer(server_id=server_id)
+                         for server_id in _add_members]
             updated_network = _add_member(module, oneandone_conn, network['id'], instances)
 
         if _remove_members:
-            for member in _remove_members:
-                instance = _find_machine(oneandone_conn, member)
-                _remove_member(module,
-                               oneandone_conn,
-                               network['id'],
-                               instance['id'])
-            updated_network = _find_private_network(oneandone_conn, network['id'])
+            _detach_members(oneandone_conn, network['id'], _remove_members, max_concurrency)
+            detached = True
 
-        changed = True if updated_network else False
+        changed = True if updated_network or detached else False
+
+        if changed:
+            invalidate_resources(oneandone_conn, 'private_networks')
+        if detached:
+            updated_network = oneandone_conn.get_private_network(network['id'])
+        elif not changed:
+            updated_network = network
 
         return (changed, updated_network)
     except Exception as ex:
@@ -384,6 +442,7 @@ def remove_network(module, oneandone_conn):
 
         private_network = _find_private_network(oneandone_conn, pn_id)
         private_network = oneandone_conn.delete_private_network(private_network['id'])
+        invalidate_resources(oneandone_conn, 'private_networks')
         _wait_for_network_deletion_completion(oneandone_conn, private_network, wait_timeout)
 
         changed = True if private_network else False
@@ -412,11 +471,30 @@ def main():
             subnet_mask=dict(type='str'),
             add_members=dict(type='list', default=[]),
             remove_members=dict(type='list', default=[]),
+            members=dict(type='list'),
+            max_concurrency=dict(type='int', default=1),
             datacenter=dict(
                 choices=DATACENTERS),
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            catalog_cache_ttl=dict(type='int', default=0),
+            catalog_cache_dir=dict(type='path', default='~/.ansible/cache/oneandone'),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -428,12 +506,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -449,6 +522,13 @@ def main():
         if not module.params.get('private_network'):
             module.fail_json(
                 msg="'private_network' parameter is required for updating a network.")
+        if module.params.get('members') is not None and (
+                module.params.get('add_members') or module.params.get('remove_members')):
+            module.fail_json(
+                msg="'members' parameter cannot be combined with add_members or remove_members.")
+        if module.params.get('max_concurrency') < 1:
+            module.fail_json(
+                msg="'max_concurrency' parameter must be at least 1.")
         try:
             (changed, private_network) = update_network(module, oneandone_conn)
         except Exception as e:
@@ -462,7 +542,7 @@ def main():
         except Exception as e:
             module.fail_json(msg=str(e))
 
-    module.exit_json(changed=changed, private_network=private_network)
+    module.exit_json(changed=changed, private_network=private_network, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
@@ -58,8 +58,61 @@ options:
     required: false
   public_ip_id:
     description:
-      - The ID of the public IP used with update and delete states.
+      - The ID or address of the public IP used with update and delete states.
     required: true
+  catalog_cache_ttl:
+    description:
+      - Number of seconds datacenter, appliance and fixed instance size listings are kept
+        in an on-disk cache shared by all tasks. The default of 0 disables the cache.
+    required: false
+    default: 0
+  catalog_cache_dir:
+    description:
+      - Directory of the on-disk catalog cache.
+    required: false
+    default: ~/.ansible/cache/oneandone
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -72,7 +125,8 @@ options:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -113,15 +167,15 @@ EXAMPLES = '''
 '''
 
 import os
-import time
 from ansible.module_utils.basic import AnsibleModule
-
-HAS_ONEANDONE_SDK = True
-
-try:
-    import oneandone.client
-except ImportError:
-    HAS_ONEANDONE_SDK = False
+from ansible.module_utils.oneandone import (
+    HAS_ONEANDONE_SDK,
+    find_resource,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    wait_for_resource_creation_completion)
 
 DATACENTERS = ['US', 'ES', 'DE', 'GB']
 
@@ -133,33 +187,17 @@ def _find_datacenter(oneandone_conn, datacenter):
     Validates the datacenter exists by ID or country code.
     Returns the datacenter ID.
     """
-    for _datacenter in oneandone_conn.list_datacenters():
-        if datacenter in (_datacenter['id'], _datacenter['country_code']):
-            return _datacenter['id']
-
-
-def _wait_for_public_ip_creation_completion(oneandone_conn,
-                                            public_ip, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the public IP info
-        public_ip = oneandone_conn.get_public_ip(public_ip['id'])
-
-        if public_ip['state'].lower() == 'active':
-            return
-        elif public_ip['state'].lower() == 'failed':
-            raise Exception('Public IP creation ' +
-                            ' failed for %s' % public_ip['id'])
-        elif public_ip['state'].lower() == 'configuring':
-            continue
-        else:
-            raise Exception(
-                'Unknown public IP state %s' % public_ip['state'])
+    _datacenter = find_resource(oneandone_conn, 'datacenters', datacenter)
+    if _datacenter:
+        return _datacenter['id']
+
 
-    raise Exception(
-        'Timed out waiting for public IP competion for %s' % public_ip['id'])
+def _find_public_ip(oneandone_conn, public_ip):
+    """
+    Validates the public IP exists by ID or address.
+    Returns the public IP if one was found.
+    """
+    return find_resource(oneandone_conn, 'public_ips', public_ip)
 
 
 def create_public_ip(module, oneandone_conn):
@@ -190,11 +228,17 @@ def create_public_ip(module, oneandone_conn):
             reverse_dns=reverse_dns,
             ip_type=ip_type,
             datacenter_id=datacenter_id)
+        invalidate_resources(oneandone_conn, 'public_ips')
 
         if wait:
-            _wait_for_public_ip_creation_completion(
-                oneandone_conn, public_ip, wait_timeout, wait_interval)
-            public_ip = oneandone_conn.get_public_ip(public_ip['id'])
+            public_ip = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'public_ip',
+                public_ip['id'],
+                wait_timeout,
+                wait_interval)
+        else:
+            record_job(module, 'public_ip', public_ip)
 
         changed = True if public_ip else False
 
@@ -221,22 +265,26 @@ def update_public_ip(module, oneandone_conn):
 
     changed = False
 
-    public_ip = oneandone_conn.get_public_ip(ip_id=public_ip_id)
+    public_ip = _find_public_ip(oneandone_conn, public_ip_id)
     if public_ip is None:
         module.fail_json(
             msg='public IP %s not found.' % public_ip_id)
 
     try:
         public_ip = oneandone_conn.modify_public_ip(
-            ip_id=public_ip_id,
+            ip_id=public_ip['id'],
             reverse_dns=reverse_dns)
+        invalidate_resources(oneandone_conn, 'public_ips')
 
         changed = True
 
         if wait:
-            _wait_for_public_ip_creation_completion(
-                oneandone_conn, public_ip, wait_timeout, wait_interval)
-            public_ip = oneandone_conn.get_public_ip(public_ip['id'])
+            public_ip = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'public_ip',
+                public_ip['id'],
+                wait_timeout,
+                wait_interval)
 
         return (changed, public_ip)
     except Exception as e:
@@ -255,14 +303,15 @@ def delete_public_ip(module, oneandone_conn):
     """
     public_ip_id = module.params.get('public_ip_id')
 
-    public_ip = oneandone_conn.get_public_ip(public_ip_id)
+    public_ip = _find_public_ip(oneandone_conn, public_ip_id)
     if public_ip is None:
         module.fail_json(
             msg='public IP %s not found.' % public_ip_id)
 
     try:
         public_ip = oneandone_conn.delete_public_ip(
-            ip_id=public_ip_id)
+            ip_id=public_ip['id'])
+        invalidate_resources(oneandone_conn, 'public_ips')
 
         changed = True if public_ip else False
 
@@ -293,6 +342,23 @@ def main():
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            catalog_cache_ttl=dict(type='int', default=0),
+            catalog_cache_dir=dict(type='path', default='~/.ansible/cache/oneandone'),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -304,12 +370,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -336,7 +397,7 @@ def main():
         except Exception as e:
             module.fail_json(msg=str(e))
 
-    module.exit_json(changed=changed, public_ip=public_ip)
+    module.exit_json(changed=changed, public_ip=public_ip, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
@@ -103,6 +103,48 @@ notes:
       (show)
   - interactive_invoices
       (show)
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -115,7 +157,8 @@ notes:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -128,15 +171,15 @@ author:
 '''
 
 import os
-import time
 from ansible.module_utils.basic import AnsibleModule
-
-HAS_ONEANDONE_SDK = True
-
-try:
-    import oneandone.client
-except ImportError:
-    HAS_ONEANDONE_SDK = False
+from ansible.module_utils.oneandone import (
+    HAS_ONEANDONE_SDK,
+    find_resource,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    wait_for_resource_creation_completion)
 
 ROLE_STATES = ['ACTIVE', 'DISABLE']
 
@@ -147,34 +190,7 @@ def _find_role(oneandone_conn, role):
     whether it is a proper ID or a name.
     Returns the role if one was found, else None.
     """
-    for _role in oneandone_conn.list_roles(per_page=1000):
-        if role in (_role['id'], _role['name']):
-            return _role
-
-
-def _wait_for_role_creation_completion(oneandone_conn, role, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the role info
-        role = oneandone_conn.get_role(role['id'])
-
-        if role['state'].lower() == 'active':
-            return
-        elif role['state'].lower() == 'failed':
-            raise Exception('User creation ' +
-                            ' failed for %s' % role['id'])
-        elif role['state'].lower() in ('enabled',
-                                       'deploying',
-                                       'configuring'):
-            continue
-        else:
-            raise Exception(
-                'Unknown role state %s' % role['state'])
-
-    raise Exception(
-        'Timed out waiting for role competion for %s' % role['id'])
+    return find_resource(oneandone_conn, 'roles', role)
 
 
 def _modify_role_permissions(module, oneandone_conn, role_id,
@@ -326,8 +342,12 @@ def update_role(module, oneandone_conn):
             changed = True
 
         if wait:
-            _wait_for_role_creation_completion(
-                oneandone_conn, role, wait_timeout, wait_interval)
+            role = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'role',
+                role['id'],
+                wait_timeout,
+                wait_interval)
 
         return (changed, role)
     except Exception as e:
@@ -361,10 +381,17 @@ def create_role(module, oneandone_conn):
 
     try:
         role = oneandone_conn.create_role(name=name)
+        invalidate_resources(oneandone_conn, 'roles')
 
         if wait:
-            _wait_for_role_creation_completion(
-                oneandone_conn, role, wait_timeout, wait_interval)
+            role = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'role',
+                role['id'],
+                wait_timeout,
+                wait_interval)
+        else:
+            record_job(module, 'role', role)
 
         changed = True if role else False
 
@@ -385,6 +412,7 @@ def remove_role(module, oneandone_conn):
 
     try:
         role = oneandone_conn.delete_role(_role['id'])
+        invalidate_resources(oneandone_conn, 'roles')
 
         changed = True if role else False
 
@@ -432,6 +460,21 @@ def main():
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -443,12 +486,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -478,7 +516,7 @@ def main():
         except Exception as e:
             module.fail_json(msg=str(e))
 
-    module.exit_json(changed=changed, role=role)
+    module.exit_json(changed=changed, role=role, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
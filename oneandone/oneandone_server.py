@@ -117,6 +117,24 @@ options:
       - The number of machines to create.
     required: false
     default: 1
+  exact_count:
+    description:
+      - Only create the machines whose hostname does not exist yet, so that running the
+        task again does not create duplicates. All hostnames are checked against a single
+        listing of the servers, and the existing machines are returned along with the new
+        ones. Requires unique hostnames, so count must be 1 unless auto_increment is set.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  max_concurrency:
+    description:
+      - The maximum number of machines created in parallel when count is greater than 1,
+        or deleted in parallel with state absent. All machines are submitted through a pool
+        of this size and waited for together. With state running or stopped, the maximum
+        number of machines whose power state is checked in parallel. The default of 1
+        creates, deletes or checks the machines one after the other.
+    required: false
+    default: 1
   ssh_key:
     description:
       - User's public SSH key (contents, not path).
@@ -127,6 +145,59 @@ options:
       - Flag to keep the storage when deleting servers.
     required: false
     default: true
+  catalog_cache_ttl:
+    description:
+      - Number of seconds datacenter, appliance and fixed instance size listings are kept
+        in an on-disk cache shared by all tasks. The default of 0 disables the cache.
+    required: false
+    default: 0
+  catalog_cache_dir:
+    description:
+      - Directory of the on-disk catalog cache.
+    required: false
+    default: ~/.ansible/cache/oneandone
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - Wait for the instance to be in state 'running' before returning.
@@ -142,7 +213,8 @@ options:
     default: 600
    wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
   auto_increment:
     description:
@@ -193,6 +265,30 @@ EXAMPLES = '''
     wait_interval: 10
     ssh_key: SSH_PUBLIC_KEY
 
+# Create forty machines, provisioning up to ten of them in parallel.
+
+- oneandone_server:
+    auth_token: oneandone_private_api_key
+    hostname: node%02d
+    fixed_instance_size: S
+    datacenter: US
+    appliance: C5A349786169F140BCBC335675014C08
+    count: 40
+    max_concurrency: 10
+    wait: yes
+
+# Make sure forty machines exist, creating only the missing ones.
+
+- oneandone_server:
+    auth_token: oneandone_private_api_key
+    hostname: node%02d
+    fixed_instance_size: S
+    datacenter: US
+    appliance: C5A349786169F140BCBC335675014C08
+    count: 40
+    exact_count: yes
+    max_concurrency: 10
+
 # Removing machines
 
 - oneandone_server:
@@ -235,11 +331,41 @@ machines:
     type: array
     sample: '[{"hostname": "my-server", "id": "server-id"}]'
     returned: always
+machines[].transition_time:
+    description: Seconds it took a machine to reach the requested power state
+    type: float
+    sample: 42.17
+    returned: when state is running or stopped, wait is true and the machine changed state
+created_machines:
+    description: ID and name of each machine already created when a parallel creation fails
+    type: array
+    sample: '[{"id": "server-id", "name": "my-server01"}]'
+    returned: on failure, when max_concurrency is greater than 1 and count is greater than 1
+perf:
+    description: API call counts and timings of the task
+    type: dict
+    sample: '{"api_calls": 3, "api_time": 0.84, "sleep_time": 5.0, "calls": {"get_server": {"count": 2}}}'
+    returned: when perf is true
 '''
 
 import os
 import time
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    CreationWatcher,
+    DeletionWatcher,
+    backoff_delays,
+    current_resource,
+    find_resource,
+    find_resources,
+    get_oneandone_connection,
+    get_resource_index,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    run_concurrently,
+    wait_for_resource_creation_completion,
+    wait_sleep)
 
 HAS_ONEANDONE_SDK = True
 
@@ -260,15 +386,18 @@ ONEANDONE_MACHINE_STATES = (
     'POWERING_OFF',
 )
 
+# Server states that end a power change without reaching its target.
+ONEANDONE_MACHINE_FAILED_STATES = ('FAILED', 'ERROR')
+
 
 def _find_datacenter(oneandone_conn, datacenter):
     """
     Validates the datacenter exists by ID or country code.
     Returns the datacenter ID.
     """
-    for _datacenter in oneandone_conn.list_datacenters():
-        if datacenter in (_datacenter['id'], _datacenter['country_code']):
-            return _datacenter['id']
+    _datacenter = find_resource(oneandone_conn, 'datacenters', datacenter)
+    if _datacenter:
+        return _datacenter['id']
 
 
 def _find_fixed_instance_size(oneandone_conn, fixed_instance_size):
@@ -276,10 +405,9 @@ def _find_fixed_instance_size(oneandone_conn, fixed_instance_size):
     Validates the fixed instance size exists by ID or name.
     Return the instance size ID.
     """
-    for _fixed_instance_size in oneandone_conn.fixed_server_flavors():
-        if fixed_instance_size in (_fixed_instance_size['id'],
-                                   _fixed_instance_size['name']):
-            return _fixed_instance_size['id']
+    _fixed_instance_size = find_resource(oneandone_conn, 'fixed_instance_sizes', fixed_instance_size)
+    if _fixed_instance_size:
+        return _fixed_instance_size['id']
 
 
 def _find_appliance(oneandone_conn, appliance):
@@ -287,9 +415,9 @@ def _find_appliance(oneandone_conn, appliance):
     Validates the appliance exists by ID or name.
     Return the appliance ID.
     """
-    for _appliance in oneandone_conn.list_appliances(q='IMAGE'):
-        if appliance in (_appliance['id'], _appliance['name']):
-            return _appliance['id']
+    _appliance = find_resource(oneandone_conn, 'appliances', appliance)
+    if _appliance:
+        return _appliance['id']
 
 
 def _find_private_network(oneandone_conn, private_network):
@@ -297,10 +425,9 @@ def _find_private_network(oneandone_conn, private_network):
     Validates the private network exists by ID or name.
     Return the private network ID.
     """
-    for _private_network in oneandone_conn.list_private_networks():
-        if private_network in (_private_network['name'],
-                               _private_network['id']):
-            return _private_network['id']
+    _private_network = find_resource(oneandone_conn, 'private_networks', private_network)
+    if _private_network:
+        return _private_network['id']
 
 
 def _find_monitoring_policy(oneandone_conn, monitoring_policy):
@@ -308,10 +435,9 @@ def _find_monitoring_policy(oneandone_conn, monitoring_policy):
     Validates the monitoring policy exists by ID or name.
     Return the monitoring policy ID.
     """
-    for _monitoring_policy in oneandone_conn.list_monitoring_policies():
-        if monitoring_policy in (_monitoring_policy['name'],
-                                 _monitoring_policy['id']):
-            return _monitoring_policy['id']
+    _monitoring_policy = find_resource(oneandone_conn, 'monitoring_policies', monitoring_policy)
+    if _monitoring_policy:
+        return _monitoring_policy['id']
 
 
 def _find_firewall_policy(oneandone_conn, firewall_policy):
@@ -319,10 +445,9 @@ def _find_firewall_policy(oneandone_conn, firewall_policy):
     Validates the firewall policy exists by ID or name.
     Return the firewall policy ID.
     """
-    for _firewall_policy in oneandone_conn.list_firewall_policies():
-        if firewall_policy in (_firewall_policy['name'],
-                               _firewall_policy['id']):
-            return _firewall_policy['id']
+    _firewall_policy = find_resource(oneandone_conn, 'firewall_policies', firewall_policy)
+    if _firewall_policy:
+        return _firewall_policy['id']
 
 
 def _find_load_balancer(oneandone_conn, load_balancer):
@@ -330,103 +455,126 @@ def _find_load_balancer(oneandone_conn, load_balancer):
     Validates the load balancer exists by ID or name.
     Return the load balancer ID.
     """
-    for _load_balancer in oneandone_conn.list_load_balancers():
-        if load_balancer in (_load_balancer['name'],
-                             _load_balancer['id']):
-            return _load_balancer['id']
+    _load_balancer = find_resource(oneandone_conn, 'load_balancers', load_balancer)
+    if _load_balancer:
+        return _load_balancer['id']
 
 
-def _find_machine(oneandone_conn, instance):
+def _resolve_references(module, oneandone_conn, references):
     """
-    Validates that the machine exists whether by ID or name.
-    Returns the machine if one was found.
+    Resolves the (label, find function, name or ID) references of a new
+    machine concurrently, and fails with every reference that was not
+    found at once. Returns the IDs in the order of the references, None
+    for the ones that were not given.
     """
-    for _machine in oneandone_conn.list_servers(per_page=1000):
-        if instance in (_machine['id'], _machine['name']):
-            return _machine
+    given = [reference for reference in references if reference[2]]
+    ids = run_concurrently(
+        lambda reference: reference[1](oneandone_conn, reference[2]),
+        given,
+        len(given))
 
+    errors = ['%s %s not found.' % (label, value)
+              for (label, find, value), _id in zip(given, ids) if _id is None]
+    if errors:
+        module.fail_json(msg=' '.join(errors))
 
-def _wait_for_machine_creation_completion(oneandone_conn,
-                                          machine, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the machine info
-        machine = oneandone_conn.get_server(machine['id'])
-
-        if machine['status']['state'].lower() == 'powered_on':
-            return
-        elif machine['status']['state'].lower() == 'failed':
-            raise Exception('Machine creation failed for %s' % machine['id'])
-        elif machine['status']['state'].lower() in ('active',
-                                                    'enabled',
-                                                    'deploying'):
-            continue
-        else:
-            raise Exception(
-                'Unknown machine state %s' % machine['status']['state'])
+    ids = iter(ids)
+    return [next(ids) if reference[2] else None for reference in references]
 
-    raise Exception(
-        'Timed out waiting for machine competion for %s' % machine['id'])
 
-
-def _wait_for_machine_deletion_completion(oneandone_conn,
-                                          machine,
-                                          wait_timeout):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(5)
-
-        # Refresh the operation info
-        logs = oneandone_conn.list_logs(q='DELETE',
-                                        period='LAST_HOUR',
-                                        sort='-start_date')
-
-        for log in logs:
-            if (log['resource']['id'] == machine['id'] and
-                    log['action'] == 'DELETE' and
-                    log['type'] == 'VM' and
-                    log['status']['state'] == 'OK'):
-                return
-    raise Exception(
-        'Timed out waiting for machine deletion for %s' % machine['id'])
-
-
-def _create_machine(module, oneandone_conn, hostname, description,
+def _submit_machine(oneandone_conn, hostname, description,
                     fixed_instance_size_id, vcore, cores_per_processor, ram,
                     hdds, datacenter_id, appliance_id, ssh_key,
                     private_network_id, firewall_policy_id, load_balancer_id,
-                    monitoring_policy_id, wait, wait_timeout,
-                    wait_interval):
+                    monitoring_policy_id):
+    """
+    Issues the create_server request for a single machine.
+    Returns the machine as reported by the API, without waiting.
+    """
+    return oneandone_conn.create_server(
+        oneandone.client.Server(
+            name=hostname,
+            description=description,
+            fixed_instance_size_id=fixed_instance_size_id,
+            vcore=vcore,
+            cores_per_processor=cores_per_processor,
+            ram=ram,
+            appliance_id=appliance_id,
+            datacenter_id=datacenter_id,
+            rsa_key=ssh_key,
+            private_network_id=private_network_id,
+            firewall_policy_id=firewall_policy_id,
+            load_balancer_id=load_balancer_id,
+            monitoring_policy_id=monitoring_policy_id,), hdds)
+
+
+def _create_machine(module, oneandone_conn, wait, wait_timeout,
+                    wait_interval, **machine_spec):
 
     try:
-        machine = oneandone_conn.create_server(
-            oneandone.client.Server(
-                name=hostname,
-                description=description,
-                fixed_instance_size_id=fixed_instance_size_id,
-                vcore=vcore,
-                cores_per_processor=cores_per_processor,
-                ram=ram,
-                appliance_id=appliance_id,
-                datacenter_id=datacenter_id,
-                rsa_key=ssh_key,
-                private_network_id=private_network_id,
-                firewall_policy_id=firewall_policy_id,
-                load_balancer_id=load_balancer_id,
-                monitoring_policy_id=monitoring_policy_id,), hdds)
+        machine = _submit_machine(oneandone_conn, **machine_spec)
 
         if wait:
-            _wait_for_machine_creation_completion(
-                oneandone_conn, machine, wait_timeout, wait_interval)
-            machine = oneandone_conn.get_server(machine['id'])  # refresh
+            machine = wait_for_resource_creation_completion(
+                oneandone_conn,
+                'server',
+                machine['id'],
+                wait_timeout,
+                wait_interval)
+        else:
+            record_job(module, 'server', machine)
 
         return machine
     except Exception as e:
         module.fail_json(msg=str(e))
 
 
+def _create_machines_concurrently(module, oneandone_conn, machine_specs,
+                                  max_concurrency, wait, wait_timeout,
+                                  wait_interval):
+    """
+    Submits all machines through a bounded pool of workers and, if
+    requested, waits for all of them together with a single watcher.
+    Returns the machines in the same order as machine_specs. When a
+    machine fails, the module fails with the ID and name of every machine
+    created so far under created_machines, so that none is left unnoticed.
+    """
+    def _submit(machine_spec):
+        try:
+            return (_submit_machine(oneandone_conn, **machine_spec), None)
+        except Exception as e:
+            return (None, e)
+
+    results = run_concurrently(_submit, machine_specs, max_concurrency)
+    machines = [machine for machine, error in results if machine is not None]
+    created_machines = [{'id': machine['id'], 'name': machine.get('name')}
+                        for machine in machines]
+
+    errors = [error for machine, error in results if error is not None]
+    if errors:
+        if not wait:
+            for machine in machines:
+                record_job(module, 'server', machine)
+        module.fail_json(
+            msg='failed to create %d of %d machines: %s' % (
+                len(errors), len(machine_specs), str(errors[0])),
+            created_machines=created_machines)
+
+    try:
+        if wait:
+            creation_watcher = CreationWatcher(oneandone_conn, max_concurrency)
+            for machine in machines:
+                creation_watcher.watch('server', machine['id'])
+            ready = creation_watcher.wait(wait_timeout, wait_interval)
+            machines = [ready[machine['id']] for machine in machines]
+        else:
+            for machine in machines:
+                record_job(module, 'server', machine)
+        return machines
+    except Exception as e:
+        module.fail_json(msg=str(e), created_machines=created_machines)
+
+
 def _insert_network_data(machine):
     for addr_data in machine['ips']:
         if addr_data['type'] == 'IPV6':
@@ -451,6 +599,7 @@ def create_machine(module, oneandone_conn):
     description = module.params.get('description')
     auto_increment = module.params.get('auto_increment')
     count = module.params.get('count')
+    exact_count = module.params.get('exact_count')
     fixed_instance_size = module.params.get('fixed_instance_size')
     vcore = module.params.get('vcore')
     cores_per_processor = module.params.get('cores_per_processor')
@@ -463,65 +612,11 @@ def create_machine(module, oneandone_conn):
     monitoring_policy = module.params.get('monitoring_policy')
     firewall_policy = module.params.get('firewall_policy')
     load_balancer = module.params.get('load_balancer')
+    max_concurrency = module.params.get('max_concurrency')
     wait = module.params.get('wait')
     wait_timeout = module.params.get('wait_timeout')
     wait_interval = module.params.get('wait_interval')
 
-    datacenter_id = _find_datacenter(oneandone_conn, datacenter)
-    if datacenter_id is None:
-        module.fail_json(
-            msg='datacenter %s not found.' % datacenter)
-
-    fixed_instance_size_id = None
-    if fixed_instance_size:
-        fixed_instance_size_id = _find_fixed_instance_size(
-            oneandone_conn,
-            fixed_instance_size)
-        if fixed_instance_size_id is None:
-            module.fail_json(
-                msg='fixed_instance_size %s not found.' % fixed_instance_size)
-
-    appliance_id = _find_appliance(oneandone_conn, appliance)
-    if appliance_id is None:
-        module.fail_json(
-            msg='datacenter %s not found.' % appliance)
-
-    private_network_id = None
-    if private_network:
-        private_network_id = _find_private_network(
-            oneandone_conn,
-            private_network)
-        if private_network_id is None:
-            module.fail_json(
-                msg='private network %s not found.' % private_network)
-
-    monitoring_policy_id = None
-    if monitoring_policy:
-        monitoring_policy_id = _find_monitoring_policy(
-            oneandone_conn,
-            monitoring_policy)
-        if monitoring_policy_id is None:
-            module.fail_json(
-                msg='monitoring policy %s not found.' % monitoring_policy)
-
-    firewall_policy_id = None
-    if firewall_policy:
-        firewall_policy_id = _find_firewall_policy(
-            oneandone_conn,
-            firewall_policy)
-        if firewall_policy_id is None:
-            module.fail_json(
-                msg='firewall policy %s not found.' % firewall_policy)
-
-    load_balancer_id = None
-    if load_balancer:
-        load_balancer_id = _find_load_balancer(
-            oneandone_conn,
-            load_balancer)
-        if load_balancer_id is None:
-            module.fail_json(
-                msg='load balancer %s not found.' % load_balancer)
-
     hostnames = []
     descriptions = []
     if auto_increment:
@@ -533,6 +628,40 @@ def create_machine(module, oneandone_conn):
         if description:
             descriptions = [description] * count
 
+    existing_machines = {}
+    missing = list(range(len(hostnames)))
+    if exact_count:
+        if len(set(hostnames)) < len(hostnames):
+            module.fail_json(
+                msg='exact_count requires unique hostnames, '
+                    'enable auto_increment or set count to 1.')
+
+        servers = get_resource_index(oneandone_conn).get('servers')
+        missing = []
+        for index, name in enumerate(hostnames):
+            if name in servers:
+                existing_machines[index] = servers[name]
+            else:
+                missing.append(index)
+        hostnames = [hostnames[index] for index in missing]
+        if descriptions:
+            descriptions = [descriptions[index] for index in missing]
+
+        if not hostnames:
+            return (False, [_insert_network_data(existing_machines[index])
+                            for index in sorted(existing_machines)])
+
+    references = _resolve_references(module, oneandone_conn, [
+        ('datacenter', _find_datacenter, datacenter),
+        ('fixed_instance_size', _find_fixed_instance_size, fixed_instance_size),
+        ('appliance', _find_appliance, appliance),
+        ('private network', _find_private_network, private_network),
+        ('monitoring policy', _find_monitoring_policy, monitoring_policy),
+        ('firewall policy', _find_firewall_policy, firewall_policy),
+        ('load balancer', _find_load_balancer, load_balancer)])
+    (datacenter_id, fixed_instance_size_id, appliance_id, private_network_id,
+     monitoring_policy_id, firewall_policy_id, load_balancer_id) = references
+
     hdd_objs = []
     if hdds:
         for hdd in hdds:
@@ -541,37 +670,57 @@ def create_machine(module, oneandone_conn):
                 is_main=hdd['is_main']
             ))
 
-    machines = []
+    machine_specs = []
     for index, name in enumerate(hostnames):
         desc = None
 
         if descriptions:
             desc = descriptions[index]
 
-        machines.append(
+        machine_specs.append(dict(
+            hostname=name,
+            description=desc,
+            fixed_instance_size_id=fixed_instance_size_id,
+            vcore=vcore,
+            cores_per_processor=cores_per_processor,
+            ram=ram,
+            hdds=hdd_objs,
+            datacenter_id=datacenter_id,
+            appliance_id=appliance_id,
+            ssh_key=ssh_key,
+            private_network_id=private_network_id,
+            monitoring_policy_id=monitoring_policy_id,
+            firewall_policy_id=firewall_policy_id,
+            load_balancer_id=load_balancer_id))
+
+    if max_concurrency > 1 and len(machine_specs) > 1:
+        machines = _create_machines_concurrently(
+            module=module,
+            oneandone_conn=oneandone_conn,
+            machine_specs=machine_specs,
+            max_concurrency=max_concurrency,
+            wait=wait,
+            wait_timeout=wait_timeout,
+            wait_interval=wait_interval)
+    else:
+        machines = [
             _create_machine(
                 module=module,
                 oneandone_conn=oneandone_conn,
-                hostname=name,
-                description=desc,
-                fixed_instance_size_id=fixed_instance_size_id,
-                vcore=vcore,
-                cores_per_processor=cores_per_processor,
-                ram=ram,
-                hdds=hdd_objs,
-                datacenter_id=datacenter_id,
-                appliance_id=appliance_id,
-                ssh_key=ssh_key,
-                private_network_id=private_network_id,
-                monitoring_policy_id=monitoring_policy_id,
-                firewall_policy_id=firewall_policy_id,
-                load_balancer_id=load_balancer_id,
                 wait=wait,
                 wait_timeout=wait_timeout,
-                wait_interval=wait_interval))
+                wait_interval=wait_interval,
+                **machine_spec)
+            for machine_spec in machine_specs]
+    invalidate_resources(oneandone_conn, 'servers')
 
     changed = True if machines else False
-    machines = [_insert_network_data(machine) for machine in machines]
+
+    # Existing and created machines are returned in hostname order.
+    ordered_machines = dict(existing_machines)
+    ordered_machines.update(zip(missing, machines))
+    machines = [_insert_network_data(ordered_machines[index])
+                for index in sorted(ordered_machines)]
 
     return (changed, machines)
 
@@ -589,24 +738,41 @@ def remove_machine(module, oneandone_conn):
     """
     instance_ids = module.params.get('instance_ids')
     keep_hdds = module.params.get('keep_hdds')
+    max_concurrency = module.params.get('max_concurrency')
     wait = module.params.get('wait')
     wait_timeout = module.params.get('wait_timeout')
+    wait_interval = module.params.get('wait_interval')
 
     if not isinstance(instance_ids, list) or len(instance_ids) < 1:
         module.fail_json(
             msg='instance_ids should be a list of machine ids or names.')
 
     removed_machines = []
-    for instance in instance_ids:
-        machine = _find_machine(oneandone_conn, instance)
-        if machine is None:
-            continue
+    removed_ids = set()
+    for machine in find_resources(oneandone_conn, 'servers', instance_ids):
+        if machine is not None and machine['id'] not in removed_ids:
+            removed_ids.add(machine['id'])
+            removed_machines.append(machine)
+
+    def delete_machine(machine):
+        oneandone_conn.delete_server(server_id=machine['id'], keep_hdds=keep_hdds)
+
+    deletion_watcher = DeletionWatcher(oneandone_conn, 'VM', 'get_server', 'machine',
+                                       max_concurrency)
+    try:
+        run_concurrently(delete_machine, removed_machines, max_concurrency)
+    except Exception as e:
+        module.fail_json(
+            msg="failed to terminate the machine: %s" % str(e))
+    finally:
+        invalidate_resources(oneandone_conn, 'servers')
 
+    for machine in removed_machines:
+        deletion_watcher.watch(machine['id'])
+
+    if wait:
         try:
-            oneandone_conn.delete_server(server_id=machine['id'], keep_hdds=keep_hdds)
-            if wait:
-                _wait_for_machine_deletion_completion(oneandone_conn, machine, wait_timeout)
-            removed_machines.append(machine)
+            deletion_watcher.wait(wait_timeout, wait_interval)
         except Exception as e:
             module.fail_json(
                 msg="failed to terminate the machine: %s" % str(e))
@@ -620,6 +786,40 @@ def remove_machine(module, oneandone_conn):
     return (changed, machines)
 
 
+def _wait_for_machines_power_state(oneandone_conn, pending, target_state,
+                                   wait_timeout, wait_interval, max_concurrency=1):
+    """
+    Polls all the pending machines together, with up to max_concurrency
+    GETs in flight, until each one reaches target_state, one of them
+    fails, or the single wait_timeout deadline expires.
+
+    pending maps machine IDs to the time their power change was requested.
+    Returns a dictionary of machine ID to (refreshed machine, elapsed seconds),
+    a dictionary of machine ID to state for the failed machines, and the
+    list of machine IDs that did not reach the target state.
+    """
+    pending = dict(pending)
+    completed = {}
+    failed = {}
+    delays = backoff_delays(wait_interval)
+
+    wait_timeout = time.time() + wait_timeout
+    while pending and not failed and wait_timeout > time.time():
+        wait_sleep(oneandone_conn, min(next(delays), max(wait_timeout - time.time(), 0)))
+
+        machine_ids = list(pending)
+        refreshed = run_concurrently(oneandone_conn.get_server, machine_ids, max_concurrency)
+        for machine_id, machine in zip(machine_ids, refreshed):
+            machine_state = machine['status']['state']
+            if machine_state == target_state:
+                completed[machine_id] = (machine, time.time() - pending.pop(machine_id))
+            elif machine_state in ONEANDONE_MACHINE_FAILED_STATES:
+                failed[machine_id] = machine_state
+                del pending[machine_id]
+
+    return completed, failed, list(pending)
+
+
 def startstop_machine(module, oneandone_conn):
     """
     Starts or Stops a machine.
@@ -627,6 +827,9 @@ def startstop_machine(module, oneandone_conn):
     module : AnsibleModule object
     oneandone_conn: authenticated oneandone object.
 
+    All the power changes are requested first, then the machines are
+    polled together until they reach the desired state.
+
     Returns a dictionary with a 'changed' attribute indicating whether
     anything has changed for any of the machines as a result of this function
     being run, and a 'machines' attribute with basic information for
@@ -634,69 +837,75 @@ def startstop_machine(module, oneandone_conn):
     """
     state = module.params.get('state')
     instance_ids = module.params.get('instance_ids')
+    max_concurrency = module.params.get('max_concurrency')
     wait = module.params.get('wait')
     wait_timeout = module.params.get('wait_timeout')
+    wait_interval = module.params.get('wait_interval')
 
     if not isinstance(instance_ids, list) or len(instance_ids) < 1:
         module.fail_json(
             msg='instance_ids should be a list of virtual ' +
                 'machine ids or names.')
 
+    if state == 'stopped':
+        target_state, action = 'POWERED_OFF', 'POWER_OFF'
+    else:
+        target_state, action = 'POWERED_ON', 'POWER_ON'
+
     machines = []
+    pending = {}
     changed = False
-    for instance_id in instance_ids:
-
-        # Resolve machine
-        machine = _find_machine(oneandone_conn, instance_id)
+    machines_found = find_resources(oneandone_conn, 'servers', instance_ids)
+    for instance_id, machine in zip(instance_ids, machines_found):
         if machine is None:
             continue
 
-        # Attempt to change the machine state, only if it's not already there
-        # or on its way.
+        # Attempt to change the machine state, only if it's not already there.
+        # A server read from the resource mirror is fetched again, as its
+        # power state may have changed since.
+        machine = current_resource(oneandone_conn, 'servers', machine)
+        if machine['status']['state'] == target_state:
+            machines.append(machine)
+            continue
+
         try:
-            if state == 'stopped':
-                if machine['status']['state'] in ('POWERED_OFF'):
-                    machines.append(machine)
-                    continue
-                oneandone_conn.modify_server_status(
-                    server_id=machine['id'],
-                    action='POWER_OFF',
-                    method='SOFTWARE')
-            elif state == 'running':
-                if machine['status']['state'] in ('POWERED_ON'):
-                    machines.append(machine)
-                    continue
-                oneandone_conn.modify_server_status(
-                    server_id=machine['id'],
-                    action='POWER_ON',
-                    method='SOFTWARE')
+            oneandone_conn.modify_server_status(
+                server_id=machine['id'],
+                action=action,
+                method='SOFTWARE')
         except Exception as e:
             module.fail_json(
                 msg="failed to set machine %s to state %s: %s" % (
                     instance_id, state, str(e)))
 
-        # Make sure the machine has reached the desired state
-        if wait:
-            operation_completed = False
-            wait_timeout = time.time() + wait_timeout
-            while wait_timeout > time.time():
-                time.sleep(5)
-                machine = oneandone_conn.get_server(machine['id'])  # refresh
-                machine_state = machine['status']['state']
-                if state == 'stopped' and machine_state == 'POWERED_OFF':
-                    operation_completed = True
-                    break
-                if state == 'running' and machine_state == 'POWERED_ON':
-                    operation_completed = True
-                    break
-            if not operation_completed:
-                module.fail_json(
-                    msg="Timeout waiting for machine %s to get to state %s" % (
-                        instance_id, state))
-
+        pending[machine['id']] = time.time()
         changed = True
         machines.append(machine)
 
+    if pending:
+        invalidate_resources(oneandone_conn, 'servers')
+
+    # Make sure the machines have reached the desired state
+    if wait and pending:
+        completed, failed, timed_out = _wait_for_machines_power_state(
+            oneandone_conn, pending, target_state, wait_timeout, wait_interval,
+            max_concurrency)
+        if failed:
+            module.fail_json(
+                msg="Machines failed to get to state %s: %s" % (
+                    state, ', '.join('%s (%s)' % (machine_id, failed[machine_id])
+                                     for machine_id in sorted(failed))))
+        if timed_out:
+            module.fail_json(
+                msg="Timeout waiting for machines %s to get to state %s" % (
+                    ', '.join(timed_out), state))
+
+        for index, machine in enumerate(machines):
+            if machine['id'] in completed:
+                machine, elapsed = completed[machine['id']]
+                machine['transition_time'] = round(elapsed, 2)
+                machines[index] = machine
+
     machines = [_insert_network_data(_machine) for _machine in machines]
 
     return (changed, machines)
@@ -749,6 +958,8 @@ def main():
             ram=dict(type='float'),
             hdds=dict(type='list'),
             count=dict(type='int', default=1),
+            exact_count=dict(type='bool', default=False),
+            max_concurrency=dict(type='int', default=1),
             ssh_key=dict(type='raw', default=None),
             auto_increment=dict(type='bool', default=True),
             instance_ids=dict(type='list'),
@@ -763,6 +974,23 @@ def main():
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            catalog_cache_ttl=dict(type='int', default=0),
+            catalog_cache_dir=dict(type='path', default='~/.ansible/cache/oneandone'),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         ),
         mutually_exclusive=(['fixed_instance_size', 'vcore'], ['fixed_instance_size', 'cores_per_processor'],
@@ -778,12 +1006,7 @@ def main():
             msg='The "auth_token" parameter or ' +
             'ONEANDONE_AUTH_TOKEN environment variable is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -806,12 +1029,15 @@ def main():
             if not module.params.get(param):
                 module.fail_json(
                     msg="%s parameter is required for new instance." % param)
+        if module.params.get('max_concurrency') < 1:
+            module.fail_json(
+                msg="max_concurrency parameter must be greater than 0.")
         try:
             (changed, machines) = create_machine(module, oneandone_conn)
         except Exception as e:
             module.fail_json(msg=str(e))
 
-    module.exit_json(changed=changed, machines=machines)
+    module.exit_json(changed=changed, machines=machines, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,306 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: oneandone_server_facts
+short_description: Gather facts about 1&1 servers.
+description:
+     - Gathers facts about the servers of a 1&1 account with one paginated listing, without
+       changing anything. The servers can be filtered by datacenter, state, name pattern and
+       IDs, and reduced to the requested fields.
+       This module has a dependency on 1and1 >= 1.0
+version_added: "2.4"
+options:
+  auth_token:
+    description:
+      - Authenticating API token provided by 1&1.
+    required: true
+  api_url:
+    description:
+      - Custom API URL. Overrides the
+        ONEANDONE_API_URL environement variable.
+    required: false
+  datacenter:
+    description:
+      - Only return the servers of this datacenter.
+    required: false
+    choices: [ "US", "ES", "DE", "GB" ]
+  state:
+    description:
+      - Only return the servers in this state.
+    required: false
+    choices: [ "DEPLOYING", "POWERED_OFF", "POWERED_ON", "POWERING_ON", "POWERING_OFF" ]
+  name:
+    description:
+      - Only return the servers whose name matches this shell-style pattern, such as node*.
+        The longest literal part of the pattern is sent to the API as a search, so that only
+        the matching servers are listed.
+    required: false
+  instance_ids:
+    description:
+      - Only return the servers with these IDs or names.
+    required: false
+  fields:
+    description:
+      - Keys of the server objects to return, such as name, status or ips. Only these keys
+        are requested from the API and returned. The id is always returned, and public_ipv4
+        and public_ipv6 are derived from ips. All keys are returned by default.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+
+requirements:
+     - "1and1"
+     - "python >= 2.6"
+
+author:
+  - Amel Ajdinovic (@aajdinov)
+  - Ethan Devenport (@edevenport)
+'''
+
+EXAMPLES = '''
+
+# Gather the names and addresses of the running servers of a datacenter.
+
+- oneandone_server_facts:
+    auth_token: oneandone_private_api_key
+    datacenter: US
+    state: POWERED_ON
+    name: node*
+    fields:
+      - name
+      - public_ipv4
+  register: facts
+
+- debug:
+    msg: "{{ facts.servers | map(attribute='public_ipv4') | list }}"
+
+# Gather everything about a few servers.
+
+- oneandone_server_facts:
+    auth_token: oneandone_private_api_key
+    instance_ids:
+      - node01
+      - node02
+
+'''
+
+RETURN = '''
+servers:
+    description: The matching servers, reduced to the requested fields
+    type: list
+    sample: '[{"id": "E7D36EC025C73796035BF4F171379025", "name": "node01", "public_ipv4": "10.4.141.136"}]'
+    returned: always
+count:
+    description: Number of matching servers
+    type: int
+    sample: 1
+    returned: always
+perf:
+    description: API call counts and timings of the task
+    type: dict
+    sample: '{"api_calls": 1, "api_time": 0.21, "sleep_time": 0.0, "calls": {"list_servers": {"count": 1}}}'
+    returned: when perf is true
+'''
+
+import fnmatch
+import os
+import re
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    HAS_ONEANDONE_SDK,
+    PAGE_SIZE,
+    get_oneandone_connection,
+    iterate_pages,
+    report_perf)
+
+DATACENTERS = ['US', 'ES', 'DE', 'GB']
+
+ONEANDONE_MACHINE_STATES = (
+    'DEPLOYING',
+    'POWERED_OFF',
+    'POWERED_ON',
+    'POWERING_ON',
+    'POWERING_OFF',
+)
+
+# Fields derived from the server IPs.
+ADDRESS_FIELDS = {
+    'public_ipv4': 'IPV4',
+    'public_ipv6': 'IPV6',
+}
+
+
+def _search_term(pattern):
+    """
+    Returns the longest literal part of a shell-style pattern, used as
+    the API search of the listing.
+    """
+    return max(re.split(r'[*?\[\]]', pattern), key=len) or None
+
+
+def _requested_fields(fields, filters):
+    """
+    Returns the fields to request from the API: the returned fields and
+    those needed by the filters, or None for all of them.
+    """
+    if not fields:
+        return None
+
+    requested = set(['id'])
+    for field in fields:
+        if field in ADDRESS_FIELDS:
+            requested.add('ips')
+        else:
+            requested.add(field)
+    for field, value in filters:
+        if value:
+            requested.add(field)
+    return ','.join(sorted(requested))
+
+
+def _insert_network_data(server):
+    for addr_data in server.get('ips') or []:
+        for field, ip_type in ADDRESS_FIELDS.items():
+            if addr_data['type'] == ip_type:
+                server[field] = addr_data['ip']
+    return server
+
+
+def _project(server, fields):
+    server = _insert_network_data(server)
+    if not fields:
+        return server
+    return dict((key, server[key]) for key in ['id'] + fields if key in server)
+
+
+def gather_facts(module, oneandone_conn):
+    """
+    Lists the servers once, page by page, keeping only the matching ones
+    reduced to the requested fields.
+
+    module : AnsibleModule object
+    oneandone_conn: authenticated oneandone object
+
+    Returns the list of matching servers.
+    """
+    datacenter = module.params.get('datacenter')
+    state = module.params.get('state')
+    name = module.params.get('name')
+    instance_ids = module.params.get('instance_ids')
+    fields = module.params.get('fields')
+
+    if instance_ids:
+        instance_ids = set(instance_ids)
+
+    kwargs = {}
+    if name:
+        kwargs['q'] = _search_term(name)
+    api_fields = _requested_fields(fields, [('datacenter', datacenter),
+                                            ('status', state),
+                                            ('name', name or instance_ids)])
+    if api_fields:
+        kwargs['fields'] = api_fields
+
+    servers = []
+    for server in iterate_pages(oneandone_conn.list_servers, PAGE_SIZE, prefetch=True, **kwargs):
+        if datacenter and (server.get('datacenter') or {}).get('country_code') != datacenter:
+            continue
+        if state and (server.get('status') or {}).get('state') != state:
+            continue
+        if name and not fnmatch.fnmatchcase(server.get('name') or '', name):
+            continue
+        if instance_ids and server['id'] not in instance_ids and server.get('name') not in instance_ids:
+            continue
+        servers.append(_project(server, fields))
+
+    return servers
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            auth_token=dict(
+                type='str',
+                default=os.environ.get('ONEANDONE_AUTH_TOKEN')),
+            api_url=dict(
+                type='str',
+                default=os.environ.get('ONEANDONE_API_URL')),
+            datacenter=dict(type='str', choices=DATACENTERS),
+            state=dict(type='str', choices=ONEANDONE_MACHINE_STATES),
+            name=dict(type='str'),
+            instance_ids=dict(type='list'),
+            fields=dict(type='list'),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+        ),
+        supports_check_mode=True
+    )
+
+    if not HAS_ONEANDONE_SDK:
+        module.fail_json(msg='1and1 required for this module')
+
+    if not module.params.get('auth_token'):
+        module.fail_json(
+            msg='auth_token parameter is required.')
+
+    oneandone_conn = get_oneandone_connection(module)
+
+    try:
+        servers = gather_facts(module, oneandone_conn)
+    except Exception as ex:
+        module.fail_json(msg=str(ex))
+
+    module.exit_json(changed=False, servers=servers, count=len(servers), **report_perf(module, oneandone_conn))
+
+
+if __name__ == '__main__':
+    main()
@@ -56,6 +56,59 @@ options:
     description:
       - ID (or name) of the datacenter where the vpn will be created.
     required: false
+  catalog_cache_ttl:
+    description:
+      - Number of seconds datacenter, appliance and fixed instance size listings are kept
+        in an on-disk cache shared by all tasks. The default of 0 disables the cache.
+    required: false
+    default: 0
+  catalog_cache_dir:
+    description:
+      - Directory of the on-disk catalog cache.
+    required: false
+    default: ~/.ansible/cache/oneandone
+  mirror_max_age:
+    description:
+      - Answer the lookups of resources by name or ID from a local SQLite mirror of the
+        account, shared by all tasks and forks using the same token. The mirror is brought up
+        to date from the audit log once it is older than this number of seconds, so 0 checks
+        the log on every task. Unset by default, which looks resources up through the API.
+        Overrides the ONEANDONE_MIRROR_MAX_AGE environment variable.
+    required: false
+  mirror_file:
+    description:
+      - File of the resource mirror. Defaults to a file in ~/.ansible/cache/oneandone named
+        after the API URL and token. Overrides the ONEANDONE_MIRROR_FILE environment variable.
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of API requests per second, shared by all tasks and forks using the
+        same token through rate_limit_file. Requests rejected with 429 Too Many Requests
+        are sent again after the delay the API asks for, whether or not this is set.
+        Overrides the ONEANDONE_RATE_LIMIT environment variable.
+    required: false
+  rate_limit_file:
+    description:
+      - File holding the shared request budget. Defaults to a file in the temporary directory
+        named after the API URL and token. Overrides the ONEANDONE_RATE_LIMIT_FILE
+        environment variable.
+    required: false
+  perf:
+    description:
+      - Collect API call counts, latencies, transferred bytes and time spent waiting,
+        and return them under the perf key.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+  perf_log:
+    description:
+      - File the perf results are appended to as one JSON line per task. Only used with perf.
+    required: false
+  job_file:
+    description:
+      - File the handles of resources created with wait disabled are appended to, one JSON
+        line per resource, so that oneandone_job_status can check them later.
+    required: false
   wait:
     description:
       - wait for the instance to be in state 'running' before returning
@@ -68,7 +121,8 @@ options:
     default: 600
   wait_interval:
     description:
-      - Defines the number of seconds to wait when using the _wait_for methods
+      - Defines the number of seconds to wait between status checks. The first check is
+        immediate, later ones back off exponentially up to four times this value.
     default: 5
 
 requirements:
@@ -139,8 +193,14 @@ EXAMPLES = '''
 '''
 
 import os
-import time
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.oneandone import (
+    find_resource,
+    get_oneandone_connection,
+    invalidate_resources,
+    record_job,
+    report_perf,
+    wait_for_resource_creation_completion)
 
 HAS_ONEANDONE_SDK = True
 
@@ -150,39 +210,12 @@ except ImportError:
     HAS_ONEANDONE_SDK = False
 
 
-def _wait_for_vpn_creation_completion(oneandone_conn, vpn, wait_timeout, wait_interval):
-    wait_timeout = time.time() + wait_timeout
-    while wait_timeout > time.time():
-        time.sleep(wait_interval)
-
-        # Refresh the vpn info
-        vpn = oneandone_conn.get_vpn(vpn['id'])
-
-        if vpn['state'].lower() == 'active':
-            return
-        elif vpn['state'].lower() == 'failed':
-            raise Exception('VPN creation ' +
-                            ' failed for %s' % vpn['id'])
-        elif vpn['state'].lower() in ('enabled',
-                                      'deploying',
-                                      'configuring'):
-            continue
-        else:
-            raise Exception(
-                'Unknown VPN state %s' % vpn['state'])
-
-    raise Exception(
-        'Timed out waiting for VPN competion for %s' % vpn['id'])
-
-
 def _find_vpn(oneandone_conn, vpn):
     """
     Validates that the vpn exists by ID or a name.
     Returns the vpn if one was found.
     """
-    for _vpn in oneandone_conn.list_vpns(per_page=1000):
-        if vpn in (_vpn['id'], _vpn['name']):
-            return _vpn
+    return find_resource(oneandone_conn, 'vpns', vpn)
 
 
 def _find_datacenter(oneandone_conn, datacenter):
@@ -190,9 +223,9 @@ def _find_datacenter(oneandone_conn, datacenter):
     Validates the datacenter exists by ID or country code.
     Returns the datacenter ID.
     """
-    for _datacenter in oneandone_conn.list_datacenters():
-        if datacenter in (_datacenter['id'], _datacenter['country_code']):
-            return _datacenter['id']
+    _datacenter = find_resource(oneandone_conn, 'datacenters', datacenter)
+    if _datacenter:
+        return _datacenter['id']
 
 
 def update_vpn(module, oneandone_conn):
@@ -246,13 +279,17 @@ def create_vpn(module, oneandone_conn):
                                     datacenter_id)
 
         vpn = oneandone_conn.create_vpn(_vpn)
+        invalidate_resources(oneandone_conn, 'vpns')
 
         if wait:
-            _wait_for_vpn_creation_completion(
+            vpn = wait_for_resource_creation_completion(
                 oneandone_conn,
-                vpn,
+                'vpn',
+                vpn['id'],
                 wait_timeout,
                 wait_interval)
+        else:
+            record_job(module, 'vpn', vpn)
 
         changed = True if vpn else False
 
@@ -273,6 +310,7 @@ def remove_vpn(module, oneandone_conn):
 
         vpn = _find_vpn(oneandone_conn, _vpn)
         vpn = oneandone_conn.delete_vpn(vpn['id'])
+        invalidate_resources(oneandone_conn, 'vpns')
 
         changed = True if vpn else False
 
@@ -300,6 +338,23 @@ def main():
             wait=dict(type='bool', default=True),
             wait_timeout=dict(type='int', default=600),
             wait_interval=dict(type='int', default=5),
+            catalog_cache_ttl=dict(type='int', default=0),
+            catalog_cache_dir=dict(type='path', default='~/.ansible/cache/oneandone'),
+            perf=dict(type='bool', default=False),
+            perf_log=dict(type='path'),
+            rate_limit=dict(
+                type='float',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT')),
+            rate_limit_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_RATE_LIMIT_FILE')),
+            mirror_max_age=dict(
+                type='int',
+                default=os.environ.get('ONEANDONE_MIRROR_MAX_AGE')),
+            mirror_file=dict(
+                type='path',
+                default=os.environ.get('ONEANDONE_MIRROR_FILE')),
+            job_file=dict(type='path'),
             state=dict(type='str', default='present'),
         )
     )
@@ -311,12 +366,7 @@ def main():
         module.fail_json(
             msg='auth_token parameter is required.')
 
-    if not module.params.get('api_url'):
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'))
-    else:
-        oneandone_conn = oneandone.client.OneAndOneService(
-            api_token=module.params.get('auth_token'), api_url=module.params.get('api_url'))
+    oneandone_conn = get_oneandone_connection(module)
 
     state = module.params.get('state')
 
@@ -346,7 +396,7 @@ def main():
         except Exception as e:
             module.fail_json(msg=str(e))
 
-    module.exit_json(changed=changed, vpn=vpn)
+    module.exit_json(changed=changed, vpn=vpn, **report_perf(module, oneandone_conn))
 
 
 if __name__ == '__main__':